@@ -0,0 +1,226 @@
+"""批量分析 save_images 下的绘画（包括 *_versions 版本目录），无需启动界面
+
+用法示例：
+    python batch_analysis.py --workers 4 --output batch_results.jsonl
+    python batch_analysis.py --sqlite data/batch_results.db
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from painting_app_features import extract_features
+from painting_app_image_cache import SUPPORTED_FORMATS, decode_image
+from painting_app_tile_delta import INDEX_NAME
+from painting_app_version_store import MANIFEST_NAME, get_version_store
+
+
+def _default_save_dir():
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, 'save_images')
+
+
+def iter_images(root):
+    """遍历目录下所有可分析的图片，返回 (路径, 版本来源)（跳过 .thumbs 等隐藏目录）
+
+    以图块差分保存的版本没有单独的图片文件：路径为版本名，版本来源为 (版本目录, 版本号, 差分文件)，
+    分析时从 .tiles 重建。
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_FORMATS:
+                yield os.path.join(dirpath, name), None
+        if MANIFEST_NAME in filenames:
+            yield from _iter_tile_versions(dirpath)
+
+
+def _iter_tile_versions(backup_dir):
+    """版本目录中按图块差分保存的版本"""
+    tiles_dir = os.path.join(backup_dir, '.tiles')
+    try:
+        with open(os.path.join(backup_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            versions = json.load(f)["versions"]
+        with open(os.path.join(tiles_dir, INDEX_NAME), 'r', encoding='utf-8') as f:
+            tile_versions = json.load(f)["versions"]
+    except FileNotFoundError:
+        return
+    except (ValueError, KeyError) as e:
+        logging.error(f"版本清单无法读取，跳过: {backup_dir}: {str(e)}")
+        return
+    for entry in versions:
+        if entry.get("kind") == "tiles" and entry["tile_version"] <= len(tile_versions):
+            data_file = os.path.join(tiles_dir, tile_versions[entry["tile_version"] - 1]["file"])
+            yield os.path.join(backup_dir, entry["name"]), (backup_dir, entry["version"], data_file)
+
+
+def _data_file(path, source):
+    return source[2] if source else path
+
+
+def analyze_file(path, source=None, mtime=None):
+    """在子进程中分析单个文件（或重建的差分版本），返回结果和各阶段耗时
+
+    文件在遍历之后被删除时记为失败（mtime 保留遍历时的值），不中断整个批次。
+    """
+    record = {"path": path, "mtime": mtime, "file_size": None}
+    timings = {}
+    try:
+        st = os.stat(_data_file(path, source))
+        record.update({"mtime": st.st_mtime, "file_size": st.st_size})
+        t0 = time.perf_counter()
+        img = get_version_store(source[0]).load(source[1]) if source else decode_image(path)
+        t1 = time.perf_counter()
+        features = extract_features(img)
+        t2 = time.perf_counter()
+        timings["decode"] = t1 - t0
+        timings["features"] = t2 - t1
+        record.update({"size": img.size, "mode": img.mode, "features": features})
+    except Exception as e:
+        record["error"] = str(e)
+    record["timings"] = timings
+    return record
+
+
+class JsonlSink:
+    """结果逐行追加写入 JSONL 文件"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def done_keys(self):
+        keys = set()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 上次中断时可能写了半行
+                    if "error" not in rec:
+                        keys.add((rec["path"], rec["mtime"]))
+        return keys
+
+    def __enter__(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+class SqliteSink:
+    """结果写入 SQLite，每条结果单独提交，中断后可以续跑"""
+
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(self.path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS batch_results (
+                        path TEXT NOT NULL,
+                        mtime REAL NOT NULL,
+                        file_size INTEGER,
+                        result TEXT,
+                        error TEXT,
+                        PRIMARY KEY(path, mtime))''')
+
+    def done_keys(self):
+        with sqlite3.connect(self.path) as conn:
+            return set(conn.execute("SELECT path, mtime FROM batch_results WHERE error IS NULL"))
+
+    def __enter__(self):
+        self._conn = sqlite3.connect(self.path)
+        return self
+
+    def write(self, record):
+        self._conn.execute('''INSERT OR REPLACE INTO batch_results (path, mtime, file_size, result, error)
+                           VALUES (?, ?, ?, ?, ?)''',
+                           (record["path"], record["mtime"], record["file_size"],
+                            json.dumps(record, ensure_ascii=False), record.get("error")))
+        self._conn.commit()
+
+    def __exit__(self, *exc):
+        self._conn.close()
+
+
+def run_batch(root, sink, workers=None, progress_every=100):
+    """并行分析目录下的全部图片，已分析且未修改的文件会被跳过"""
+    done = sink.done_keys()
+    pending, skipped = [], 0
+    for path, source in iter_images(root):
+        try:
+            mtime = os.path.getmtime(_data_file(path, source))
+        except OSError:
+            continue  # 遍历期间被删除
+        if (path, mtime) in done:
+            skipped += 1
+        else:
+            pending.append((path, source, mtime))
+    logging.info(f"批量分析: 共 {len(pending)} 个待处理文件，已跳过 {skipped} 个")
+    print(f"待处理 {len(pending)} 个文件（已完成 {skipped} 个）")
+
+    stage_totals = defaultdict(float)
+    processed = errors = 0
+    start = time.perf_counter()
+    with sink, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(analyze_file, p, source, mtime) for p, source, mtime in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            sink.write(record)
+            processed += 1
+            if "error" in record:
+                errors += 1
+                logging.error(f"批量分析失败: {record['path']}: {record['error']}")
+            for stage, seconds in record["timings"].items():
+                stage_totals[stage] += seconds
+            if processed % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"已处理 {processed}/{len(pending)}，{processed / elapsed:.1f} 文件/秒")
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "processed": processed,
+        "errors": errors,
+        "skipped": skipped,
+        "elapsed": elapsed,
+        "files_per_second": processed / elapsed if elapsed else 0.0,
+        "stage_avg_ms": {stage: total * 1000 / processed for stage, total in stage_totals.items()},
+    }
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量分析 save_images 中的绘画")
+    parser.add_argument("--input", default=_default_save_dir(), help="图片目录（默认 save_images）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL 结果文件")
+    parser.add_argument("--sqlite", default=None, help="改为写入该 SQLite 数据库")
+    args = parser.parse_args(argv)
+
+    sink = SqliteSink(args.sqlite) if args.sqlite else JsonlSink(args.output)
+    stats = run_batch(args.input, sink, workers=args.workers)
+
+    print(f"完成: {stats['processed']} 个文件，失败 {stats['errors']} 个，"
+          f"耗时 {stats['elapsed']:.1f} 秒，{stats['files_per_second']:.1f} 文件/秒")
+    for stage, ms in stats["stage_avg_ms"].items():
+        print(f"  {stage}: 平均 {ms:.1f} 毫秒/文件")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filename='painting_analyzer.log'
+    )
+    main()
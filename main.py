@@ -1,6 +1,9 @@
 import tkinter as tk
 from auth_window import AuthWindow
 from painting_analyzer_app import PaintingAnalyzerApp
+from psychology_report import app_id as DRAWING_APP_ID
+from questionnaire_window import QUESTIONNAIRE_APP_ID
+from report_pipeline import report_pipeline
 from user_db import UserDB
 
 # ------------------------- 应用入口 -------------------------
@@ -19,12 +22,15 @@ class Application:
     def on_auth_success(self, username, user_id):
         self.current_user = username
         self.root.withdraw()
+        # 登录后就在后台预建两个报告应用的对话，生成报告时不必再等新建对话
+        report_pipeline.warm_conversations(DRAWING_APP_ID, QUESTIONNAIRE_APP_ID)
 
         main_window = tk.Toplevel(self.root)
         PaintingAnalyzerApp(main_window, username, user_id, self.db)
         main_window.protocol("WM_DELETE_WINDOW", self.on_main_window_close)
 
     def on_main_window_close(self):
+        self.db.close()
         self.root.destroy()
 
 
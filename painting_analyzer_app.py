@@ -1,18 +1,15 @@
 import logging
 import re
-import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import messagebox
 import sys
 import subprocess
 import shutil
-import threading
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageTk, ImageGrab
 import os
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from questionnaire_window import QuestionnaireWindow
-from psychology_report import generate_psychology_report
+from questionnaire_scoring import score_answers, format_scale_scores
+from report_pipeline import report_pipeline
 import time
 import win32gui
 import win32ui
@@ -22,8 +19,6 @@ from painting_app_file_handling import (
     _init_save_dir,
     _load_history,
     auto_save_progress,
-    _create_version,
-    _capture_active_window,
     start_painting,
     monitor_file_changes,
     _save_final_version,
@@ -38,7 +33,8 @@ from painting_app_analysis import (
     _show_preview
 )
 from painting_app_ui_setup import _setup_ui, _setup_status_indicator
-from painting_app_event_handlers import _on_file_change, on_close
+from painting_app_event_handlers import on_close
+from painting_app_report_view import ReportView
 
 # 配置日志系统
 logging.basicConfig(
@@ -59,6 +55,9 @@ class PaintingAnalyzerApp:
         self.analysis_id = None
         self.save_dir = _init_save_dir()
         self.latest_image = None
+        self.latest_features = None  # 最近一次分析得到的绘画特征
+        self.process_analytics = None  # 当前绘画过程的增量统计
+        self.drawing_report_job = None  # 问卷提交后在后台生成的绘画报告
         _setup_ui(self)
         _load_history(self)
         _setup_status_indicator(self)
@@ -76,23 +75,28 @@ class PaintingAnalyzerApp:
         else:
             messagebox.showwarning("警告", "未找到可分析的文件")
 
-    def _start_analysis_with_answers(self, answers):
+    def _start_analysis_with_answers(self, answers, scores=None):
         self.status_indicator.update_status(2)  # 进入分析完成状态
 
         try:
-            result = _perform_analysis(self)
-            # 将分析结果存入数据库
-            analysis_id = self.db.add_analysis_record(
+            if scores is None:
+                scores = score_answers(answers)  # 问卷窗口已计分时直接使用，不重复计算
+            result, features = _perform_analysis(self)
+            self.latest_features = features
+            # 分析结果、绘画特征和问卷答案在同一个事务中存入数据库
+            analysis_id = self.db.submit_analysis(
                 self.user_id,
                 self.latest_image,
                 result,
-                {"questionnaire": answers}
+                {"questionnaire": answers, "features": features},
+                answers=answers,
+                scores=scores
             )
             self.analysis_id = analysis_id  # 保存 analysis_id 为实例属性
-            # 将问卷结果存入数据库
-            self.db.add_questionnaire_answers(self.user_id, analysis_id, answers)
-            _load_history(self)
-            messagebox.showinfo("分析完成", result)
+            # 问卷报告生成的同时，绘画报告也在后台开始生成
+            self.drawing_report_job = report_pipeline.start_drawing_report(self.latest_image, features)
+            self.history_panel.add_record(analysis_id)  # 只插入新的一行
+            messagebox.showinfo("分析完成", f"{result}\n\n量表得分：\n{format_scale_scores(scores)}" if scores else result)
             self.status_indicator.update_status(3)  # 第三个指示灯变为黄色
         except Exception as e:
             messagebox.showerror("分析错误", str(e))
@@ -110,6 +114,7 @@ class PaintingAnalyzerApp:
                 latest = max(files, key=lambda x: x[1])[0]
                 self.latest_image = os.path.join(self.save_dir, latest)
                 _update_file_info(self, self.latest_image)
+                report_pipeline.prefetch_drawing(self.latest_image)
         except Exception as e:
             messagebox.showerror("错误", f"查找文件失败：{str(e)}")
 
@@ -121,54 +126,25 @@ class PaintingAnalyzerApp:
             messagebox.showwarning("警告", "未完成答题，请先完成答题流程")
             return
 
-        def show_loading():
-            loading_window = tk.Toplevel(self.master)
-            loading_window.title("正在生成报告...")
-            loading_window.geometry("400x300")
-            loading_window.resizable(False, False)
-
-            style = ttk.Style()
-            style.theme_use('default')
-            style.configure("TProgressbar", thickness=30)
-            progress = ttk.Progressbar(loading_window, style="TProgressbar", mode='indeterminate')
-            progress.pack(pady=20)
-            progress.start()
-
-            return loading_window
-
-        def hide_loading(loading_window):
-            loading_window.destroy()
-
-        def generate_report_async():
-            loading_window = show_loading()
-            try:
-                report = generate_psychology_report()
-                if report:
-                    print("心理分析报告:", report)
-                else:
-                    report = "未找到报告内容"
-
-                hide_loading(loading_window)
-                if self.analysis_id is not None:
-                    self.db.add_final_report(self.analysis_id, report)
-                messagebox.showinfo("心理分析报告", report)
-                self.status_indicator.update_status(4)  # 第四个指示灯变为绿色
-                _load_history(self)
-            except Exception as e:
-                hide_loading(loading_window)
-                messagebox.showerror("错误", str(e))
-
-        threading.Thread(target=generate_report_async, daemon=True).start()
-
-
-
-class FileChangeHandler(FileSystemEventHandler):
-    def __init__(self, directory, callback):
-        self.directory = directory
-        self.callback = callback
-
-    def on_modified(self, event):
-        self.callback(event)
-
-    def on_created(self, event):
-        self.callback(event)
\ No newline at end of file
+        # 报告窗口逐段显示流式返回的文字；问卷提交时已经开始的报告直接接上
+        view = ReportView(self.master, "心理分析报告")
+        job = self.drawing_report_job or report_pipeline.start_drawing_report(self.latest_image,
+                                                                               self.latest_features)
+        self.drawing_report_job = None  # 再次点击时重新生成
+        analysis_id = self.analysis_id
+
+        def on_done(report):
+            if report:
+                print("心理分析报告:", report)
+            else:
+                report = "未找到报告内容"
+            view.finish(report)
+            if analysis_id is not None:
+                self.db.add_final_report(analysis_id, report)
+                self.master.after(0, self.history_panel.update_record, analysis_id)
+            self.master.after(0, self.status_indicator.update_status, 4)  # 第四个指示灯变为绿色
+
+        def on_error(error):
+            view.fail(str(error))
+
+        job.attach(view.append, on_done, on_error)
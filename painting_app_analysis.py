@@ -9,47 +9,48 @@ from datetime import datetime
 from PIL import Image, ImageDraw, ImageTk, ImageGrab
 import logging
 from tkinter import messagebox
-import gimpformats
+
+from painting_app_features import extract_features, format_features
+from painting_app_image_cache import SUPPORTED_FORMATS, load_image
+from painting_app_metadata import probe_image_metadata
+from painting_app_thumbnails import get_thumbnail_store
 
 
 def _perform_analysis(app):
-    """执行分析操作（跳过无法处理的格式）"""
+    """执行分析操作（跳过无法处理的格式），返回 (分析文本, 特征字典)"""
     try:
         # 检查是否支持的文件格式
-        supported_formats = ['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.xcf']  # 添加 xcf 格式
         ext = os.path.splitext(app.latest_image)[1].lower()
 
-        if ext not in supported_formats:
+        if ext not in SUPPORTED_FORMATS:
             raise RuntimeError(f"暂不支持分析{ext}格式文件，请导出为PNG/JPG格式")
 
-        if ext == '.xcf':
-            xcf = gimpformats.GimpDocument(app.latest_image)
-            img = xcf.flatten()  # 将 xcf 文件转换为 PIL 图像
-        else:
-            img = Image.open(app.latest_image)
+        img = load_image(app.latest_image)  # xcf 文件在缓存中合并为 PIL 图像
+        features = extract_features(img)
 
-        return (f"基础分析报告：\n"
-                f"尺寸：{img.size}\n"
-                f"模式：{img.mode}\n"
-                f"文件大小：{os.path.getsize(app.latest_image)} 字节\n"
-                f"初步检测：图像结构正常")
+        report = (f"基础分析报告：\n"
+                  f"尺寸：{img.size}\n"
+                  f"模式：{img.mode}\n"
+                  f"文件大小：{os.path.getsize(app.latest_image)} 字节\n"
+                  f"{format_features(features)}")
+        return report, features
     except Exception as e:
         raise RuntimeError(f"分析失败：{str(e)}")
 
 
 def create_blank_canvas(path, size=(1920, 1080)):
-    """创建空白画布（始终生成PNG格式）"""
+    """创建空白画布（始终生成PNG格式），返回时间戳文字所占的区域 (左, 上, 右, 下)，失败时返回 None"""
     try:
         img = Image.new("RGB", size, (255, 255, 255))
         draw = ImageDraw.Draw(img)
-        draw.text((20, 20),
-                  f"临时画布 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                  fill=(200, 200, 200))
+        text = f"临时画布 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        draw.text((20, 20), text, fill=(200, 200, 200))
         img.save(path, "PNG")
-        return True
+        left, top, right, bottom = draw.textbbox((20, 20), text)
+        return left - 2, top - 2, right + 2, bottom + 2  # 留出抗锯齿的边缘
     except Exception as e:
         messagebox.showerror("错误", f"创建画布失败：{str(e)}")
-        return False
+        return None
 
 
 def _get_paint_tool():
@@ -91,39 +92,42 @@ def _run_paint_tool(tool, path, app):
 def _update_file_info(app, path):
     """更新文件信息显示"""
     try:
-        if path.lower().endswith('.xcf'):
-            xcf = gimpformats.GimpDocument(path)
-            img = xcf.flatten()
-        else:
-            img = Image.open(path)
+        meta = probe_image_metadata(path)  # 只读文件头，不解码像素
         info = (f"文件路径：{path}\n"
-                f"文件大小：{os.path.getsize(path)} 字节\n"
-                f"图片尺寸：{img.size}\n"
-                f"最后修改：{datetime.fromtimestamp(os.path.getmtime(path))}")
+                f"文件大小：{meta['file_size']} 字节\n"
+                f"图片尺寸：{meta['size']}\n"
+                f"颜色模式：{meta['mode']}\n")
+        if meta.get('layers'):
+            info += f"图层数量：{meta['layers']}\n"
+        info += f"最后修改：{datetime.fromtimestamp(meta['mtime'])}"
         app.file_info.config(text=info)
     except Exception as e:
         messagebox.showerror("错误", f"读取文件失败：{str(e)}")
 
 
 def _show_preview(app, path):
-    """显示图片预览"""
-    try:
-        if path.lower().endswith('.xcf'):
-            xcf = gimpformats.GimpDocument(path)
-            img = xcf.flatten()
-        else:
-            img = Image.open(path)
-        # 计算合适的缩略图尺寸，保持宽高比
-        max_size = (300, 300)
-        width, height = img.size
-        if width > max_size[0] or height > max_size[1]:
-            ratio_w = max_size[0] / width
-            ratio_h = max_size[1] / height
-            ratio = min(ratio_w, ratio_h)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    """显示图片预览（缩略图未生成时在后台生成，完成后回到界面线程显示）"""
+    app.preview_path = path
 
+    def on_ready(img, error):
+        app.master.after(0, _apply_preview, app, path, img, error)
+
+    # 从 save_images/.thumbs 读取预生成的缩略图（保持宽高比，最长边 300）
+    get_thumbnail_store(app.save_dir).get_async(path, on_ready, 300)
+
+
+def _apply_preview(app, path, img, error):
+    if getattr(app, 'preview_path', None) != path:
+        return  # 期间又选择了其他文件
+    if error is not None:
+        if isinstance(error, FileNotFoundError):
+            messagebox.showerror("错误", f"文件 {path} 不存在")
+        elif isinstance(error, OSError):
+            messagebox.showerror("错误", f"无法识别的文件格式：{path}")
+        else:
+            messagebox.showerror("错误", f"生成预览失败：{str(error)}")
+        return
+    try:
         # 释放之前的 PhotoImage 对象（如果存在）
         if hasattr(app.preview_label, 'image'):
             app.preview_label.image = None
@@ -131,10 +135,6 @@ def _show_preview(app, path):
         photo = ImageTk.PhotoImage(img)
         app.preview_label.config(image=photo)
         app.preview_label.image = photo
-    except FileNotFoundError:
-        messagebox.showerror("错误", f"文件 {path} 不存在")
-    except OSError:
-        messagebox.showerror("错误", f"无法识别的文件格式：{path}")
     except Exception as e:
         messagebox.showerror("错误", f"生成预览失败：{str(e)}")
 
@@ -0,0 +1,115 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+
+class BackupQueue:
+    """有界的后台备份队列
+
+    文件事件只负责入队，由工作线程执行实际的合并/复制/编码；同一路径还没开始处理的旧任务
+    会被新事件替换，队列满时丢弃最早的任务，保证监控线程始终不被阻塞。
+    """
+
+    def __init__(self, workers=2, maxsize=64):
+        self.workers = workers
+        self.maxsize = maxsize
+        self._pending = OrderedDict()  # 路径 -> (处理函数, 入队时间)
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._latencies = deque(maxlen=200)
+        self.submitted = 0
+        self.replaced = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def _ensure_workers(self):
+        if not self._threads:
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"backup-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, path, handler):
+        """提交备份任务（不阻塞）；handler(path) 在工作线程中执行"""
+        with self._cond:
+            self._ensure_workers()
+            self.submitted += 1
+            if path in self._pending:
+                self._pending.pop(path)
+                self.replaced += 1
+            elif len(self._pending) >= self.maxsize:
+                old_path, _ = self._pending.popitem(last=False)
+                self.dropped += 1
+                logging.warning(f"备份队列已满，丢弃任务: {old_path}")
+            self._pending[path] = (handler, time.monotonic())
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._cond.notify()
+
+    def _next_task(self):
+        """取最早的、且同一路径没有正在处理的任务"""
+        for path in self._pending:
+            if path not in self._in_flight:
+                handler, enqueued = self._pending.pop(path)
+                self._in_flight.add(path)
+                return path, handler, enqueued
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+            path, handler, enqueued = task
+            try:
+                handler(path)
+                ok = True
+            except Exception as e:
+                ok = False
+                logging.error(f"备份失败: {path}: {str(e)}")
+            with self._cond:
+                self._in_flight.discard(path)
+                self._latencies.append(time.monotonic() - enqueued)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """等待队列中已有的任务全部完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        """队列深度与备份延迟（从最后一次事件入队到备份完成）"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            return {
+                "depth": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "replaced": self.replaced,
+                "dropped": self.dropped,
+                "completed": self.completed,
+                "failed": self.failed,
+                "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+                "latency_max": latencies[-1] if latencies else 0.0,
+            }
+
+
+# 全局共享的备份队列
+backup_queue = BackupQueue()
@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+
+import numpy as np
+import win32gui
+import win32ui
+import win32con
+from PIL import Image, ImageGrab
+
+from painting_app_backup_queue import backup_queue
+
+# 截图 PNG 的压缩级别
+CAPTURE_PNG_COMPRESS_LEVEL = 1
+# 比较帧时使用的缩略边长
+SIGNATURE_SIZE = 32
+
+
+class WindowCapturer:
+    """窗口截图：设备上下文和位图在窗口尺寸不变时重复使用，不再每次重新创建"""
+
+    def __init__(self):
+        self._hdesktop = None
+        self._hwnd_dc = None
+        self._mfc_dc = None
+        self._save_dc = None
+        self._bitmap = None
+        self._size = None
+
+    def _ensure_dc(self, width, height):
+        if self._mfc_dc is None:
+            self._hdesktop = win32gui.GetDesktopWindow()
+            self._hwnd_dc = win32gui.GetWindowDC(self._hdesktop)
+            self._mfc_dc = win32ui.CreateDCFromHandle(self._hwnd_dc)
+            self._save_dc = self._mfc_dc.CreateCompatibleDC()
+        if self._size != (width, height):
+            old_bitmap = self._bitmap
+            self._bitmap = win32ui.CreateBitmap()
+            self._bitmap.CreateCompatibleBitmap(self._mfc_dc, width, height)
+            # 先选入新位图，旧位图不再被选中后才能删除（GDI 拒绝删除仍被选中的对象）
+            self._save_dc.SelectObject(self._bitmap)
+            if old_bitmap is not None:
+                win32gui.DeleteObject(old_bitmap.GetHandle())
+            self._size = (width, height)
+
+    def grab(self, hwnd):
+        """截取窗口区域；没有窗口句柄或截图失败时退回全屏截图"""
+        if hwnd:
+            try:
+                rect = win32gui.GetWindowRect(hwnd)
+                width = rect[2] - rect[0]
+                height = rect[3] - rect[1]
+                self._ensure_dc(width, height)
+                self._save_dc.BitBlt((0, 0), (width, height), self._mfc_dc, (rect[0], rect[1]), win32con.SRCCOPY)
+                bmpinfo = self._bitmap.GetInfo()
+                bmpstr = self._bitmap.GetBitmapBits(True)
+                return Image.frombuffer(
+                    "RGB",
+                    (bmpinfo['bmWidth'], bmpinfo['bmHeight']),
+                    bmpstr, "raw", "BGRX", 0, 1
+                )
+            except Exception as e:
+                logging.error(f"截图失败: {str(e)}")
+                self.close()
+        else:
+            logging.error("未找到绘画软件窗口句柄")
+        return ImageGrab.grab()
+
+    def close(self):
+        """释放设备上下文和位图"""
+        try:
+            # 先删除设备上下文，位图随之不再被选中，然后才能删除位图
+            if self._save_dc is not None:
+                self._save_dc.DeleteDC()
+            if self._bitmap is not None:
+                win32gui.DeleteObject(self._bitmap.GetHandle())
+            if self._mfc_dc is not None:
+                self._mfc_dc.DeleteDC()
+            if self._hwnd_dc is not None:
+                win32gui.ReleaseDC(self._hdesktop, self._hwnd_dc)
+        except Exception as e:
+            logging.error(f"释放截图资源失败: {str(e)}")
+        self._hdesktop = self._hwnd_dc = self._mfc_dc = self._save_dc = self._bitmap = None
+        self._size = None
+
+
+def frame_signature(img, size=SIGNATURE_SIZE):
+    """把画面缩成 size x size 的灰度图，用于快速判断画面是否变化"""
+    factor = min(img.size) // (size * 4)
+    if factor >= 2:
+        img = img.reduce(factor)
+    small = img.convert('L').resize((size, size), Image.Resampling.BOX)
+    return np.asarray(small, dtype=np.int16)
+
+
+def frame_difference(a, b):
+    """两个缩略灰度图的平均差异（0~1）"""
+    if a is None or b is None or a.shape != b.shape:
+        return 1.0
+    return float(np.abs(a - b).mean()) / 255
+
+
+class ChangeAwareCapture:
+    """按画面变化程度自适应的截图：画面不变或几乎不变时跳过，变化越频繁截图间隔越短"""
+
+    def __init__(self, backup_dir, get_hwnd, min_interval=2.0, max_interval=30.0, threshold=0.005):
+        self.backup_dir = backup_dir
+        self.get_hwnd = get_hwnd
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.interval = min_interval
+        self.capturer = WindowCapturer()
+        self._last_signature = None
+        self.captured = 0
+        self.skipped = 0
+
+    def capture_once(self):
+        """截一帧，有变化时交给后台队列编码保存，返回保存路径（跳过时返回 None）"""
+        img = self.capturer.grab(self.get_hwnd())
+        signature = frame_signature(img)
+        diff = frame_difference(signature, self._last_signature)
+        if diff < self.threshold:
+            self.skipped += 1
+            self.interval = min(self.max_interval, self.interval * 1.5)
+            return None
+
+        self._last_signature = signature
+        self.captured += 1
+        self.interval = max(self.min_interval, self.interval / 2)
+        save_path = os.path.join(self.backup_dir, f"screenshot_{int(time.time() * 1000)}.png")
+        # PNG 编码放到备份线程，截图线程只负责抓帧
+        backup_queue.submit(save_path, lambda path: img.save(path, "PNG", compress_level=CAPTURE_PNG_COMPRESS_LEVEL))
+        logging.info(f"截图保存: {save_path}（变化 {diff:.3f}）")
+        return save_path
@@ -0,0 +1,156 @@
+import numpy as np
+from PIL import Image
+
+# 与背景色任一通道差值超过该阈值的像素视为笔迹
+INK_THRESHOLD = 40
+# 亮度梯度超过该阈值的像素视为边缘
+EDGE_THRESHOLD = 32
+# 统计留白时使用的网格大小（像素）
+BLANK_CELL = 32
+# 主色调数量
+PALETTE_SIZE = 5
+
+_QUADRANT_NAMES = ("左上", "右上", "左下", "右下")
+
+
+def _to_rgb(img):
+    """转为 RGB 图片，透明区域按白色背景合成（均在 PIL 的 C 实现中完成）"""
+    if img.mode == 'RGB':
+        return img
+    if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        if rgba.getchannel('A').getextrema()[0] < 255:
+            white = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+            rgba = Image.alpha_composite(white, rgba)
+        return rgba.convert('RGB')
+    return img.convert('RGB')
+
+
+def _bucket_index(r, g, b, bits):
+    """按每通道 bits 位量化，返回颜色桶编号"""
+    shift = 8 - bits
+    return ((r >> shift).astype(np.int32) << (2 * bits)) | ((g >> shift).astype(np.int32) << bits) | (b >> shift)
+
+
+def _bucket_color(index, bits):
+    """颜色桶编号还原为桶中心的 RGB"""
+    mask = (1 << bits) - 1
+    half = 1 << (7 - bits)
+    r, g, b = (index >> (2 * bits)) & mask, (index >> bits) & mask, index & mask
+    return tuple(int((c << (8 - bits)) + half) for c in (r, g, b))
+
+
+def _ratio(part, total):
+    return round(float(part) / total, 4) if total else 0.0
+
+
+def extract_features(img):
+    """提取绘画特征：笔迹覆盖率、颜色分布与主色调、象限占用、边缘/笔触密度、重心位置和留白比例"""
+    rgb = _to_rgb(img)
+    width, height = rgb.size
+    total = height * width
+    # 按通道拆成连续的平面数组，逐通道比较比 (H, W, 3) 广播快一个数量级
+    channels = [np.asarray(c) for c in rgb.split()]
+
+    # 背景色：隔 4 像素采样，4 位量化后出现最多的颜色
+    sample = [c[::4, ::4] for c in channels]
+    counts = np.bincount(_bucket_index(*sample, 4).ravel(), minlength=1 << 12)
+    background = _bucket_color(int(counts.argmax()), 4)
+
+    # 笔迹掩码：任一通道与背景色差值超过阈值
+    ink = np.zeros((height, width), dtype=bool)
+    for channel, value in zip(channels, background):
+        if value - INK_THRESHOLD > 0:
+            ink |= channel < value - INK_THRESHOLD
+        if value + INK_THRESHOLD < 255:
+            ink |= channel > value + INK_THRESHOLD
+    ink_pixels = int(np.count_nonzero(ink))
+
+    # 亮度与边缘（水平/竖直一阶差分）
+    lum = np.asarray(rgb.convert('L')).astype(np.int16)
+    edges = np.zeros((height, width), dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(lum, axis=1)) > EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(np.diff(lum, axis=0)) > EDGE_THRESHOLD
+    edge_pixels = int(np.count_nonzero(edges))
+
+    # 重心与外接框（用行/列投影计算，避免取全部坐标）
+    rows = np.count_nonzero(ink, axis=1)
+    cols = np.count_nonzero(ink, axis=0)
+    if ink_pixels:
+        cy = float((rows * np.arange(height)).sum()) / ink_pixels
+        cx = float((cols * np.arange(width)).sum()) / ink_pixels
+        ys = np.flatnonzero(rows)
+        xs = np.flatnonzero(cols)
+        centroid = (round(cx / width, 4), round(cy / height, 4))
+        bbox = (round(xs[0] / width, 4), round(ys[0] / height, 4),
+                round((xs[-1] + 1) / width, 4), round((ys[-1] + 1) / height, 4))
+    else:
+        centroid = None
+        bbox = None
+
+    # 象限占用
+    mid_y, mid_x = height // 2, width // 2
+    quadrants = {}
+    for name, block in zip(_QUADRANT_NAMES, (ink[:mid_y, :mid_x], ink[:mid_y, mid_x:],
+                                             ink[mid_y:, :mid_x], ink[mid_y:, mid_x:])):
+        filled = int(np.count_nonzero(block))
+        quadrants[name] = {"coverage": _ratio(filled, block.size), "ink_share": _ratio(filled, ink_pixels)}
+
+    # 留白：不含笔迹的网格单元比例
+    gh, gw = height // BLANK_CELL, width // BLANK_CELL
+    if gh and gw:
+        cells = ink[:gh * BLANK_CELL, :gw * BLANK_CELL].reshape(gh, BLANK_CELL, gw, BLANK_CELL).any(axis=(1, 3))
+        blank_area_ratio = _ratio(cells.size - int(np.count_nonzero(cells)), cells.size)
+    else:
+        blank_area_ratio = 1.0 - _ratio(ink_pixels, total)
+
+    # 颜色直方图与主色调（只统计笔迹像素）
+    if ink_pixels:
+        ink_rgb = [c[ink] for c in channels]
+        histogram = {name: (np.bincount(c >> 5, minlength=8) / ink_pixels).round(4).tolist()
+                     for name, c in zip("rgb", ink_rgb)}
+        palette_counts = np.bincount(_bucket_index(*ink_rgb, 3), minlength=1 << 9)
+        top = np.argsort(palette_counts)[::-1][:PALETTE_SIZE]
+        palette = [{"color": "#%02x%02x%02x" % _bucket_color(int(i), 3),
+                    "ratio": _ratio(palette_counts[i], ink_pixels)}
+                   for i in top if palette_counts[i]]
+        mean_color = "#%02x%02x%02x" % tuple(int(c.mean()) for c in ink_rgb)
+    else:
+        histogram = {c: [0.0] * 8 for c in "rgb"}
+        palette = []
+        mean_color = None
+
+    return {
+        "size": (width, height),
+        "background_color": "#%02x%02x%02x" % background,
+        "ink_coverage": _ratio(ink_pixels, total),
+        "blank_area_ratio": blank_area_ratio,
+        "edge_density": _ratio(edge_pixels, total),
+        "stroke_density": _ratio(edge_pixels, ink_pixels),
+        "centroid": centroid,
+        "bounding_box": bbox,
+        "quadrants": quadrants,
+        "color_histogram": histogram,
+        "dominant_palette": palette,
+        "mean_ink_color": mean_color,
+        "mean_brightness": round(float(lum.mean()) / 255, 4),
+    }
+
+
+def format_features(features):
+    """把特征结果整理成可读文本（用于分析结果展示和报告提示词）"""
+    lines = [
+        f"笔迹覆盖率：{features['ink_coverage']:.2%}",
+        f"留白比例：{features['blank_area_ratio']:.2%}",
+        f"边缘密度：{features['edge_density']:.2%}",
+        f"笔触密度：{features['stroke_density']:.2f}",
+    ]
+    if features['centroid']:
+        cx, cy = features['centroid']
+        lines.append(f"画面重心：水平 {cx:.2f}，竖直 {cy:.2f}（0~1，左上为原点）")
+    lines.append("象限占用：" + "，".join(
+        f"{name} {q['ink_share']:.0%}" for name, q in features['quadrants'].items()))
+    if features['dominant_palette']:
+        lines.append("主色调：" + "，".join(
+            f"{p['color']} {p['ratio']:.0%}" for p in features['dominant_palette']))
+    return "\n".join(lines)
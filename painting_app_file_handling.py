@@ -1,19 +1,22 @@
 import os
-import shutil
 import subprocess
 import sys
 import threading
 import time
 import win32gui
-import win32ui
-import win32con
 from datetime import datetime
-from PIL import Image, ImageGrab
 import logging
 from tkinter import messagebox
-import tkinter as tk
 
 from painting_app_analysis import create_blank_canvas, _get_paint_tool, _update_file_info, _show_preview
+from painting_app_backup_queue import backup_queue
+from painting_app_capture import ChangeAwareCapture
+from painting_app_image_cache import SUPPORTED_FORMATS, load_image
+from painting_app_process_analytics import ProcessAnalytics
+from painting_app_thumbnails import get_thumbnail_store
+from painting_app_version_store import get_version_store
+from painting_app_watcher import DebouncedFileWatcher
+from report_pipeline import report_pipeline
 
 
 def _init_save_dir():
@@ -29,106 +32,29 @@ def _init_save_dir():
 
 
 def _load_history(app):
-    history = app.db.get_user_history(app.user_id)  # 修正为传入 user_id
-    app.history_text.config(state=tk.NORMAL)
-    app.history_text.delete(1.0, tk.END)
+    """从第一页重新加载历史列表（只读取摘要，完整报告在选中时读取）"""
+    app.history_panel.refresh()
 
-    if history:
-        for index, (analysis_time, file_path, analysis_result, final_report) in enumerate(history, start=1):
-            try:
-                time_str = datetime.fromisoformat(analysis_time).strftime("%Y-%m-%d %H:%M:%S")
-                record = f"{index}. 分析时间：{time_str}\n" \
-                         f"文件路径：{file_path}\n" \
-                         f"分析结果：\n{analysis_result}\n"
-                if final_report:
-                    record += f"最终报告：\n{final_report}\n"
-                record += f"------------------------\n"
-                app.history_text.insert(tk.END, record)
-            except ValueError:
-                app.history_text.insert(tk.END, f"{index}. 无法解析分析时间\n")
-    else:
-        app.history_text.insert(tk.END, "暂无历史记录")
-    app.history_text.config(state=tk.DISABLED)
 
-
-def auto_save_progress(original_path, backup_dir):
-    """智能自动保存核心逻辑"""
+def auto_save_progress(app, original_path, backup_dir, stop_event):
+    """智能自动保存核心逻辑（绘画软件运行期间执行，stop_event 置位后结束）"""
+    capture = ChangeAwareCapture(backup_dir, lambda: app.painting_hwnd)
     try:
-        version = 1
-        last_change = time.time()
-
-        while True:
-            # 方案1：通过文件变化检测（兼容大部分软件）
-            if os.path.exists(original_path):
-                current_mtime = os.path.getmtime(original_path)
-                if current_mtime > last_change:
-                    _create_version(original_path, backup_dir, version)
-                    version += 1
-                    last_change = current_mtime
-
-            # 方案2：通过屏幕截图捕获（备用方案）
-            screenshot_path = os.path.join(backup_dir, f"screenshot_{int(time.time())}.png")
-            _capture_active_window(screenshot_path)
+        # 文件版本由 monitor_file_changes 的防抖监控统一写入，这里只做截图，画面无变化时跳过
+        while not stop_event.is_set():
+            try:
+                capture.capture_once()
+            except Exception as e:
+                logging.error(f"截图失败: {str(e)}")
 
-            time.sleep(5)  # 每5s自动保存一次
+            # 画面变化越频繁间隔越短（2~30秒）
+            stop_event.wait(capture.interval)
 
     except Exception as e:
         logging.error(f"自动保存异常: {str(e)}")
-
-
-def _create_version(file_path, backup_dir, version):
-    """创建版本备份"""
-    try:
-        filename = os.path.basename(file_path)
-        name, ext = os.path.splitext(filename)
-        version_file = f"{name}_auto_{version:03d}{ext}"
-        version_path = os.path.join(backup_dir, version_file)
-
-        shutil.copy2(file_path, version_path)
-        logging.info(f"自动保存版本: {version_path}")
-    except Exception as e:
-        logging.error(f"版本创建失败: {str(e)}")
-
-
-def _capture_active_window(save_path,app):
-    """截图备用方案"""
-    try:
-        if app.painting_hwnd:
-            rect = win32gui.GetWindowRect(app.painting_hwnd)
-            width = rect[2] - rect[0]
-            height = rect[3] - rect[1]
-
-            hdesktop = win32gui.GetDesktopWindow()
-            hwndDC = win32gui.GetWindowDC(hdesktop)
-            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-            saveDC = mfcDC.CreateCompatibleDC()
-
-            saveBitMap = win32ui.CreateBitmap()
-            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
-            saveDC.SelectObject(saveBitMap)
-            saveDC.BitBlt((0, 0), (width, height), mfcDC, (rect[0], rect[1]), win32con.SRCCOPY)
-
-            bmpinfo = saveBitMap.GetInfo()
-            bmpstr = saveBitMap.GetBitmapBits(True)
-            img = Image.frombuffer(
-                "RGB",
-                (bmpinfo['bmWidth'], bmpinfo['bmHeight']),
-                bmpstr, "raw", "BGRX", 0, 1
-            )
-            img.save(save_path)
-            logging.info(f"截图保存: {save_path}")
-        else:
-            logging.error("未找到绘画软件窗口句柄")
-
-    except Exception as e:
-        logging.error(f"截图失败: {str(e)}")
-        # 使用PIL的备用截图方案
-        try:
-            img = ImageGrab.grab()
-            img.save(save_path)
-            logging.info(f"全屏截图保存: {save_path}")
-        except Exception as e:
-            logging.error(f"全屏截图失败: {str(e)}")
+    finally:
+        capture.capturer.close()
+        logging.info(f"截图统计: 保存 {capture.captured} 帧，跳过 {capture.skipped} 帧")
 
 
 def start_painting(app):
@@ -140,7 +66,8 @@ def start_painting(app):
 
         # 创建临时画布文件（PNG格式）
         temp_path = os.path.join(app.save_dir, f"{base_name}_temp.png")
-        if not create_blank_canvas(temp_path):
+        stamp_box = create_blank_canvas(temp_path)
+        if not stamp_box:
             return
 
         # 启动绘画软件
@@ -162,33 +89,29 @@ def start_painting(app):
 
                 win32gui.EnumWindows(enum_windows_callback, None)
 
-                # 初始化监控参数
-                initial_mtime = os.path.getmtime(temp_path)
-                initial_size = os.path.getsize(temp_path)
                 backup_dir = os.path.join(app.save_dir, f"{base_name}_versions")
                 os.makedirs(backup_dir, exist_ok=True)
 
-                # 启动静默监控线程
-                monitor_thread = threading.Thread(
-                    target=monitor_file_changes,
-                    args=(temp_path, backup_dir, process, initial_mtime, initial_size),
-                    daemon=True
-                )
-                monitor_thread.start()
-
-                process.wait()
-
+                # 绘画期间的自动保存与截图
+                stop_autosave = threading.Event()
                 autosave_thread = threading.Thread(
                     target=auto_save_progress,
-                    args=(temp_path, backup_dir),
+                    args=(app, temp_path, backup_dir, stop_autosave),
                     daemon=True
                 )
                 autosave_thread.start()
 
-                # 检测最终保存的文件（静默操作）
-                final_path = _detect_saved_file(base_name, temp_path)
+                # 事件驱动的静默监控，绘画软件退出后检测并保存最终版本（静默操作）
+                try:
+                    final_path = monitor_file_changes(app, temp_path, backup_dir, process, ignore_box=stamp_box,
+                                                      find_final_file=lambda: _detect_saved_file(base_name, temp_path))
+                finally:
+                    stop_autosave.set()
+
                 if final_path:
                     app.latest_image = final_path
+                    # 用户答题期间在后台新建对话并上传绘画
+                    report_pipeline.prefetch_drawing(final_path)
                     _update_file_info(app, final_path)
                     _show_preview(app, final_path)
                     app.status_indicator.update_status(1)
@@ -200,56 +123,80 @@ def start_painting(app):
     threading.Thread(target=painting_task, daemon=True).start()
 
 
-def monitor_file_changes(file_path, backup_dir, process, initial_mtime, initial_size):
-    """静默监控文件变化并自动备份（10秒间隔）"""
-    version = 1
-    last_mtime = initial_mtime
-    last_size = initial_size
-
+def monitor_file_changes(app, file_path, backup_dir, process, quiet_period=1.0, ignore_box=None,
+                         find_final_file=None):
+    """监控文件变化并自动备份：连续写入在文件静止 quiet_period 秒后合并为一次备份
+
+    进程结束后保存最终版本；find_final_file 返回另存的最终文件（如 xcf）时一并保存，
+    两者都计入绘画过程统计。返回最终文件路径。
+    """
+    store = get_version_store(backup_dir)
+    thumbnails = get_thumbnail_store(app.save_dir)
+    # 绘画过程统计：分块差分版本直接接收变化的图块，其余格式按帧比较；画布上的时间戳不算笔迹
+    analytics = ProcessAnalytics(tile_size=store.tiles.tile_size, ignore_box=ignore_box)
+    store.tiles.listeners.append(analytics.on_tile_delta)
+    app.process_analytics = analytics
+    stats_path = os.path.join(backup_dir, 'process_stats.json')
+
+    def record_version(path, entry):
+        # kra/psd/ora 等无法解码的格式只保存版本，不计入按帧比较的统计
+        if entry["kind"] == "blob" and os.path.splitext(path)[1].lower() in SUPPORTED_FORMATS:
+            try:
+                analytics.update_frame(load_image(path))
+            except Exception as e:
+                logging.error(f"绘画过程统计失败: {path}: {str(e)}")
+        analytics.save(stats_path)
+
+    def backup_version(path):
+        entry = store.add(path)
+        if entry:
+            logging.info(f"自动备份版本: {os.path.join(backup_dir, entry['name'])}")
+            record_version(path, entry)
+        thumbnails.schedule_rebuild(path)
+
+    def on_file_settled(path):
+        # 版本编码放到后台备份队列，监控线程立即返回
+        backup_queue.submit(path, backup_version)
+
+    watcher = DebouncedFileWatcher(on_file_settled, quiet_period=quiet_period)
+    watcher.watch(file_path)
     try:
-        while process.poll() is None:  # 仅在进程运行时监控
-            current_mtime = os.path.getmtime(file_path)
-            current_size = os.path.getsize(file_path)
-
-            # 检测到有效变化（文件大小变化超过1KB或内容修改）
-            if (current_mtime != last_mtime) and (abs(current_size - last_size) > 10):
-                # 生成版本文件名
-                filename = os.path.basename(file_path)
-                name, ext = os.path.splitext(filename)
-                version_file = f"{name}_v{version:03d}{ext}"
-                version_path = os.path.join(backup_dir, version_file)
-
-                # 静默复制文件
-                try:
-                    shutil.copy2(file_path, version_path)
-                    logging.info(f"自动备份版本: {version_path}")
-                    version += 1
-                    last_mtime = current_mtime
-                    last_size = current_size
-                except Exception as copy_error:
-                    logging.error(f"备份失败: {str(copy_error)}")
-
-            time.sleep(1)
-
-        # 进程结束后处理最终版本
-        _save_final_version(file_path, backup_dir, version)
-
+        watcher.start()
+        app.observer = watcher
+        process.wait()  # 仅在进程运行时监控
     except Exception as e:
         logging.error(f"监控异常中断: {str(e)}")
-
-
-def _save_final_version(file_path, backup_dir, version):
-    """保存最终版本且不提示"""
+    finally:
+        watcher.stop()
+        watcher.join()
+        app.observer = None
+        backup_queue.flush()
+        logging.info(f"备份队列统计: {backup_queue.stats()}")
+
+    # 进程结束后处理最终版本
+    final_path = find_final_file() if find_final_file else file_path
+    for path in dict.fromkeys(p for p in (file_path, final_path) if p):
+        _save_final_version(path, backup_dir, record_version)
+    store.tiles.listeners.remove(analytics.on_tile_delta)
+    analytics.save(stats_path)
+    return final_path
+
+
+def _save_final_version(file_path, backup_dir, on_saved=None):
+    """保存最终版本且不提示（与上一版本相同时跳过），保存后调用 on_saved(路径, 版本信息)"""
+    if not os.path.exists(file_path):
+        return
     try:
-        if os.path.exists(file_path):
-            filename = os.path.basename(file_path)
-            name, ext = os.path.splitext(filename)
-            version_file = f"{name}_v{version:03d}{ext}"
-            version_path = os.path.join(backup_dir, version_file)
-            shutil.copy2(file_path, version_path)
-            logging.info(f"保存最终版本: {version_path}")
+        entry = get_version_store(backup_dir).add(file_path)
     except Exception as e:
         logging.error(f"最终版本保存失败: {str(e)}")
+        return
+    if entry is None:
+        logging.info("最终版本与上一版本相同，跳过保存")
+        return
+    logging.info(f"保存最终版本: {os.path.join(backup_dir, entry['name'])}")
+    if on_saved:
+        on_saved(file_path, entry)
 
 
 def _detect_saved_file(base_name, temp_path):
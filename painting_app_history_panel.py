@@ -0,0 +1,138 @@
+import logging
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+
+
+def _format_time(analysis_time):
+    try:
+        return datetime.fromisoformat(analysis_time).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return "无法解析分析时间"
+
+
+class HistoryPanel:
+    """历史分析报告面板
+
+    列表只显示每条记录的摘要，按页从数据库读取，滚动到底部附近时再加载下一页；
+    选中某条记录时才读取完整的分析结果和最终报告。新增或更新记录时只改动对应的一行。
+    """
+
+    def __init__(self, parent, db, user_id, page_size=20):
+        self.db = db
+        self.user_id = user_id
+        self.page_size = page_size
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self._details = {}  # analysis_id -> (分析结果, 最终报告)，已读取过的完整内容
+
+        self.frame = ttk.Frame(parent)
+        list_frame = ttk.Frame(self.frame)
+        self.tree = ttk.Treeview(list_frame, columns=("time", "summary", "report"),
+                                 show="headings", height=5, selectmode="browse")
+        self.tree.heading("time", text="分析时间")
+        self.tree.heading("summary", text="分析结果")
+        self.tree.heading("report", text="最终报告")
+        self.tree.column("time", width=140, stretch=False)
+        self.tree.column("summary", width=480)
+        self.tree.column("report", width=70, stretch=False, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(list_frame, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=lambda first, last: self._on_scroll(scrollbar, first, last))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        detail_scrollbar = tk.Scrollbar(self.frame)
+        detail_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.detail_text = tk.Text(self.frame, height=6, yscrollcommand=detail_scrollbar.set, state=tk.DISABLED)
+        self.detail_text.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+        detail_scrollbar.config(command=self.detail_text.yview)
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    @staticmethod
+    def _row_values(row):
+        _, analysis_time, _, summary, has_report = row
+        summary = " ".join((summary or "").split())
+        return _format_time(analysis_time), summary, "有" if has_report else "—"
+
+    def _insert_rows(self, rows, index=tk.END):
+        for row in rows:
+            iid = str(row[0])
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=self._row_values(row))
+            else:
+                self.tree.insert("", index, iid=iid, values=self._row_values(row))
+
+    def refresh(self):
+        """重新从第一页开始加载"""
+        self.tree.delete(*self.tree.get_children())
+        self._details.clear()
+        self._cursor = None
+        self._exhausted = False
+        self._show_detail("")
+        self.load_more()
+        if not self.tree.get_children():
+            self._show_detail("暂无历史记录")
+
+    def load_more(self):
+        """加载下一页摘要"""
+        if self._exhausted or self._loading:
+            return
+        self._loading = True
+        try:
+            rows, self._cursor = self.db.get_user_history_page(self.user_id, self._cursor, self.page_size)
+            self._exhausted = self._cursor is None
+            self._insert_rows(rows)
+        except Exception as e:
+            logging.error(f"加载历史记录失败: {str(e)}")
+        finally:
+            self._loading = False
+
+    def _on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # 可见区域接近底部时预取下一页
+        if float(last) > 0.9 and not self._exhausted:
+            self.tree.after_idle(self.load_more)
+
+    def add_record(self, analysis_id):
+        """新分析完成后只在列表顶部插入这一行"""
+        self.update_record(analysis_id, index=0)
+
+    def update_record(self, analysis_id, index=0):
+        """记录有变化（例如写入了最终报告）时只刷新这一行"""
+        row = self.db.get_history_summary(self.user_id, analysis_id)
+        if row is None:
+            return
+        self._details.pop(row[0], None)
+        self._insert_rows([row], index)
+        selection = self.tree.selection()
+        if selection and selection[0] == str(row[0]):
+            self._on_select()
+
+    def _on_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        analysis_id = int(selection[0])
+        detail = self._details.get(analysis_id)
+        if detail is None:
+            detail = self.db.get_analysis_detail(self.user_id, analysis_id)
+            if detail is None:
+                return
+            self._details[analysis_id] = detail
+        analysis_result, final_report = detail
+        text = f"分析结果：\n{analysis_result}\n"
+        if final_report:
+            text += f"最终报告：\n{final_report}\n"
+        self._show_detail(text)
+
+    def _show_detail(self, text):
+        self.detail_text.config(state=tk.NORMAL)
+        self.detail_text.delete(1.0, tk.END)
+        self.detail_text.insert(tk.END, text)
+        self.detail_text.config(state=tk.DISABLED)
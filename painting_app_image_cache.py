@@ -0,0 +1,121 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+# 可以完整解码分析的格式
+SUPPORTED_FORMATS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.xcf')
+
+
+def decode_image(path):
+    """完整解码图片（xcf 文件先合并图层）"""
+    if path.lower().endswith('.xcf'):
+        import gimpformats
+        xcf = gimpformats.GimpDocument(path)
+        return xcf.flatten()
+    img = Image.open(path)
+    img.load()  # 立即解码，避免后续共享时再次读取文件
+    return img
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件内容的 SHA-256（版本去重、缩略图索引和报告缓存共用）"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _image_nbytes(img):
+    """估算解码后图片占用的内存字节数"""
+    width, height = img.size
+    return width * height * len(img.getbands())
+
+
+class ImageCache:
+    """进程内共享的解码图片缓存，按 (路径, 修改时间, 文件大小) 索引，超出字节预算时按 LRU 淘汰"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (img, nbytes)
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _make_key(path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def get(self, path):
+        """获取解码后的图片，文件未变化时直接返回缓存（调用方不要修改返回的图片）"""
+        key = self._make_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        img = decode_image(path)
+        nbytes = _image_nbytes(img)
+        with self._lock:
+            # 同一路径的旧版本已经失效，直接移除
+            for old_key in [k for k in self._entries if k[0] == key[0] and k != key]:
+                self._remove(old_key)
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = (img, nbytes)
+                self._current_bytes += nbytes
+                while self._current_bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self.evictions += 1
+        return img
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self._current_bytes -= nbytes
+
+    def invalidate(self, path=None):
+        """清除指定路径（或全部）的缓存"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._current_bytes = 0
+                return
+            abs_path = os.path.abspath(path)
+            for key in [k for k in self._entries if k[0] == abs_path]:
+                self._remove(key)
+
+    def stats(self):
+        """返回命中/未命中计数与当前占用"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 全局共享实例：分析、文件信息、预览共用同一份解码结果
+image_cache = ImageCache()
+
+
+def load_image(path):
+    """通过全局缓存加载图片"""
+    img = image_cache.get(path)
+    logging.debug(f"图片缓存统计: {image_cache.stats()}")
+    return img
@@ -0,0 +1,122 @@
+import os
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+
+from PIL import Image
+
+# XCF base_type 到 PIL 模式名的映射
+_XCF_MODES = {0: 'RGB', 1: 'L', 2: 'P'}
+# PSD 颜色模式
+_PSD_MODES = {0: '1', 1: 'L', 2: 'P', 3: 'RGB', 4: 'CMYK', 7: 'Multichannel', 8: 'Duotone', 9: 'LAB'}
+
+
+def _local_name(tag):
+    """去掉 XML 命名空间前缀"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _probe_pil(path):
+    """PNG/JPEG/TIFF：Image.open 只解析文件头，不解码像素"""
+    with Image.open(path) as img:
+        return {
+            "format": img.format,
+            "size": img.size,
+            "mode": img.mode,
+            "layers": getattr(img, 'n_frames', 1),
+        }
+
+
+def _probe_xcf(path):
+    """读取 GIMP xcf 文件头和图层指针表"""
+    with open(path, 'rb') as f:
+        magic = f.read(14)
+        if not magic.startswith(b'gimp xcf '):
+            raise ValueError("不是有效的xcf文件")
+        tag = magic[9:13]
+        version = 0 if tag == b'file' else int(tag[1:])
+        width, height, base_type = struct.unpack('>III', f.read(12))
+        if version >= 4:
+            f.read(4)  # precision
+        # 跳过图像属性列表，直到 PROP_END
+        while True:
+            prop_type, prop_size = struct.unpack('>II', f.read(8))
+            if prop_type == 0:
+                break
+            f.seek(prop_size, os.SEEK_CUR)
+        # 图层指针以 0 结尾，v11 起为 64 位
+        ptr_fmt, ptr_len = ('>Q', 8) if version >= 11 else ('>I', 4)
+        layers = 0
+        while True:
+            chunk = f.read(ptr_len)
+            if len(chunk) < ptr_len or struct.unpack(ptr_fmt, chunk)[0] == 0:
+                break
+            layers += 1
+    return {
+        "format": f"XCF v{version}",
+        "size": (width, height),
+        "mode": _XCF_MODES.get(base_type, str(base_type)),
+        "layers": layers,
+    }
+
+
+def _probe_psd(path):
+    """读取 Photoshop psd 文件头"""
+    with open(path, 'rb') as f:
+        header = f.read(26)
+    if header[:4] != b'8BPS':
+        raise ValueError("不是有效的psd文件")
+    channels, height, width, depth, mode = struct.unpack('>HIIHH', header[12:26])
+    return {
+        "format": "PSD",
+        "size": (width, height),
+        "mode": _PSD_MODES.get(mode, str(mode)),
+        "layers": None,
+        "channels": channels,
+        "bit_depth": depth,
+    }
+
+
+def _probe_kra(path):
+    """从 Krita 的 maindoc.xml 清单读取尺寸与图层"""
+    with zipfile.ZipFile(path) as zf:
+        root = ET.fromstring(zf.read('maindoc.xml'))
+    image = next(el for el in root.iter() if _local_name(el.tag) == 'IMAGE')
+    layers = sum(1 for el in image.iter() if _local_name(el.tag) == 'layer')
+    return {
+        "format": "KRA",
+        "size": (int(image.get('width')), int(image.get('height'))),
+        "mode": image.get('colorspacename'),
+        "layers": layers,
+    }
+
+
+def _probe_ora(path):
+    """从 OpenRaster 的 stack.xml 清单读取尺寸与图层"""
+    with zipfile.ZipFile(path) as zf:
+        root = ET.fromstring(zf.read('stack.xml'))
+    layers = sum(1 for el in root.iter() if _local_name(el.tag) == 'layer')
+    return {
+        "format": "ORA",
+        "size": (int(root.get('w')), int(root.get('h'))),
+        "mode": "RGBA",
+        "layers": layers,
+    }
+
+
+_PROBES = {
+    '.xcf': _probe_xcf,
+    '.psd': _probe_psd,
+    '.kra': _probe_kra,
+    '.ora': _probe_ora,
+}
+
+
+def probe_image_metadata(path):
+    """只读取文件头获取图片元数据（尺寸、模式、图层数等），不解码像素"""
+    ext = os.path.splitext(path)[1].lower()
+    info = _PROBES.get(ext, _probe_pil)(path)
+    st = os.stat(path)
+    info["file_size"] = st.st_size
+    info["mtime"] = st.st_mtime
+    return info
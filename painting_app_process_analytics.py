@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+from painting_app_features import INK_THRESHOLD
+
+# 相邻两个版本间隔超过该秒数视为一次停顿
+PAUSE_THRESHOLD = 30.0
+# 图块笔迹覆盖率下降超过该值视为擦除
+ERASE_THRESHOLD = 0.02
+# 统计“先画哪里”时把画面分成 3x3 个区域
+_REGION_NAMES = ("左上", "上中", "右上", "左中", "中间", "右中", "左下", "下中", "右下")
+
+
+def _tile_coverage(tiles, ignore=None):
+    """批量计算图块的笔迹覆盖率：tiles 形状为 (n, T, T, C)，ignore 为 (n, T, T) 的不计入笔迹的像素掩码"""
+    if tiles.shape[-1] >= 3:
+        lum = (tiles[..., 0].astype(np.uint16) * 77 + tiles[..., 1].astype(np.uint16) * 150
+               + tiles[..., 2].astype(np.uint16) * 29) >> 8
+    else:
+        lum = tiles[..., 0]
+    ink = lum < 255 - INK_THRESHOLD
+    if tiles.shape[-1] in (2, 4):
+        ink &= tiles[..., -1] > 0  # 透明像素不算笔迹
+    if ignore is not None:
+        ink &= ~ignore
+    return ink.reshape(len(tiles), -1).mean(axis=1).astype(np.float32)
+
+
+class ProcessAnalytics:
+    """绘画过程的增量统计：每个新版本只处理变化的图块
+
+    维护的统计量：
+        activity      每个图块发生变化的次数（笔触活动热力图）
+        first_drawn   每个图块第一次出现笔迹的版本号（-1 表示尚未绘制）
+        erase_events  覆盖率明显下降的擦除事件
+        pauses        相邻版本之间超过 PAUSE_THRESHOLD 秒的停顿
+
+    ignore_box 为不计入笔迹的区域 (左, 上, 右, 下)，例如空白画布上的浅灰色时间戳。
+    """
+
+    def __init__(self, tile_size=64, pause_threshold=PAUSE_THRESHOLD, erase_threshold=ERASE_THRESHOLD,
+                 ignore_box=None):
+        self.tile_size = tile_size
+        self.ignore_box = ignore_box
+        self._ignore = None  # 按图块切分的 ignore_box 掩码
+        self.pause_threshold = pause_threshold
+        self.erase_threshold = erase_threshold
+        self._lock = threading.Lock()
+        self.grid_shape = None
+        self.coverage = None
+        self.activity = None
+        self.first_drawn = None
+        self.erase_events = []
+        self.pauses = []
+        self.versions = 0
+        self.started_at = None
+        self.last_update = None
+
+    def _reset(self, grid_shape):
+        self.grid_shape = tuple(grid_shape)
+        self.coverage = np.zeros(grid_shape, dtype=np.float32)
+        self.activity = np.zeros(grid_shape, dtype=np.int32)
+        self.first_drawn = np.full(grid_shape, -1, dtype=np.int32)
+        self._ignore = self._ignore_mask(grid_shape)
+
+    def _ignore_mask(self, grid_shape):
+        """ignore_box 切分为 (图块数, T, T) 的像素掩码；没有忽略区域时为 None"""
+        if self.ignore_box is None:
+            return None
+        t = self.tile_size
+        th, tw = grid_shape
+        mask = np.zeros((th * t, tw * t), dtype=bool)
+        left, top, right, bottom = (max(int(v), 0) for v in self.ignore_box)
+        mask[top:bottom, left:right] = True
+        return mask.reshape(th, t, tw, t).swapaxes(1, 2).reshape(th * tw, t, t)
+
+    def update_tiles(self, index, tiles, grid_shape, reset=False, timestamp=None):
+        """用变化的图块更新统计（index 为按行展开的图块编号）"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if reset or self.grid_shape != tuple(grid_shape):
+                self._reset(grid_shape)
+            new_cov = _tile_coverage(tiles, None if self._ignore is None else self._ignore[index])
+            self.versions += 1
+            if self.started_at is None:
+                self.started_at = timestamp
+            elif timestamp - self.last_update > self.pause_threshold:
+                self.pauses.append({"start": self.last_update, "duration": round(timestamp - self.last_update, 1),
+                                    "before_version": self.versions})
+            self.last_update = timestamp
+
+            coverage = self.coverage.reshape(-1)
+            old_cov = coverage[index]
+            coverage[index] = new_cov
+            self.activity.reshape(-1)[index] += 1
+
+            first = self.first_drawn.reshape(-1)
+            newly_drawn = index[(first[index] < 0) & (new_cov > 0)]
+            first[newly_drawn] = self.versions
+
+            erased = index[old_cov - new_cov > self.erase_threshold]
+            if len(erased):
+                tile_area = self.tile_size * self.tile_size
+                self.erase_events.append({
+                    "version": self.versions,
+                    "time": timestamp,
+                    "tiles": int(len(erased)),
+                    "area": int(((old_cov - new_cov)[old_cov - new_cov > self.erase_threshold]).sum() * tile_area),
+                })
+
+    def on_tile_delta(self, entry, index, tiles, grid_shape, reset):
+        """作为 TileDeltaHistory 的监听器使用"""
+        self.update_tiles(index, tiles, grid_shape, reset)
+
+    def update_frame(self, img, timestamp=None):
+        """没有图块差分时（xcf 等整文件版本），与上一帧比较后只提交变化的图块"""
+        if img.mode not in ('L', 'RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        arr = np.asarray(img)
+        if arr.ndim == 2:
+            arr = arr[..., None]
+        t = self.tile_size
+        h, w, c = arr.shape
+        th, tw = -(-h // t), -(-w // t)
+        padded = np.full((th * t, tw * t, c), 255, dtype=np.uint8)
+        padded[:h, :w] = arr
+        grid = padded.reshape(th, t, tw, t, c).swapaxes(1, 2).reshape(th * tw, t, t, c)
+        with self._lock:
+            reset = self.grid_shape != (th, tw)
+            previous = None if reset else self.coverage.reshape(-1).copy()
+            ignore = self._ignore_mask((th, tw)) if reset else self._ignore
+        coverage = _tile_coverage(grid, ignore)
+        changed = np.arange(th * tw) if previous is None else np.flatnonzero(coverage != previous)
+        if len(changed):
+            self.update_tiles(changed.astype(np.int32), grid[changed], (th, tw), reset, timestamp)
+
+    def summary(self):
+        """整理为可保存的统计结果"""
+        with self._lock:
+            if self.grid_shape is None:
+                return {"versions": 0}
+            activity = self.activity
+            peak = int(activity.max()) or 1
+            # 3x3 区域的首次绘制顺序
+            rows = np.array_split(np.arange(self.grid_shape[0]), 3)
+            cols = np.array_split(np.arange(self.grid_shape[1]), 3)
+            regions = []
+            for i, r in enumerate(rows):
+                for j, c in enumerate(cols):
+                    block = self.first_drawn[np.ix_(r, c)]
+                    drawn = block[block >= 0]
+                    if drawn.size:
+                        regions.append((int(drawn.min()), _REGION_NAMES[i * 3 + j]))
+            regions.sort()
+            return {
+                "versions": self.versions,
+                "duration": round(self.last_update - self.started_at, 1),
+                "paused": round(sum(p["duration"] for p in self.pauses), 1),
+                "grid_shape": list(self.grid_shape),
+                "activity_heatmap": (activity / peak).round(3).tolist(),
+                "first_drawn": self.first_drawn.tolist(),
+                "region_order": [name for _, name in regions],
+                "erase_events": list(self.erase_events),
+                "pauses": list(self.pauses),
+                "coverage": round(float(self.coverage.mean()), 4),
+            }
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logging.debug(f"绘画过程统计已更新: {path}")
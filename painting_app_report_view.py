@@ -0,0 +1,108 @@
+import time
+import queue
+import tkinter as tk
+from tkinter import ttk
+
+# 后台线程写入的文字每隔多少毫秒刷新到界面
+POLL_INTERVAL_MS = 50
+
+
+class ReportView:
+    """逐段显示大模型报告的窗口
+
+    append/finish/fail 可以在任意线程调用，内容经队列转交给界面线程；
+    同时记录用户看到第一段文字的时间和总耗时。
+    """
+
+    def __init__(self, master, title):
+        self.window = tk.Toplevel(master)
+        self.window.title(title)
+        self.window.geometry("600x450")
+        self.status = ttk.Label(self.window, text="正在生成报告...")
+        self.status.pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.progress = ttk.Progressbar(self.window, mode='indeterminate')
+        self.progress.pack(fill=tk.X, padx=10, pady=5)
+        self.progress.start()
+
+        text_frame = ttk.Frame(self.window)
+        scrollbar = tk.Scrollbar(text_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(text_frame, wrap=tk.WORD, yscrollcommand=scrollbar.set, state=tk.DISABLED)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        scrollbar.config(command=self.text.yview)
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+
+        self.started = time.perf_counter()
+        self.first_chunk = None  # 首段文字显示的时间（秒）
+        self.duration = None
+        self._queue = queue.Queue()
+        self._closed = False
+        self.window.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.window.after(POLL_INTERVAL_MS, self._poll)
+
+    def append(self, text):
+        self._queue.put(("text", text))
+
+    def finish(self, text=None):
+        """报告结束；没有收到任何片段时（非流式回退）直接显示 text"""
+        self._queue.put(("done", text))
+
+    def fail(self, message):
+        self._queue.put(("error", message))
+
+    def _insert(self, text):
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, text)
+        self.text.see(tk.END)
+        self.text.config(state=tk.DISABLED)
+
+    def _poll(self):
+        if self._closed:
+            return
+        chunks = []
+        try:
+            while True:
+                kind, value = self._queue.get_nowait()
+                if kind == "text":
+                    chunks.append(value)
+                    continue
+                if chunks:
+                    self._show_chunks(chunks)
+                    chunks = []
+                if kind == "done":
+                    self._done(value)
+                else:
+                    self._error(value)
+                return  # 报告已结束，不再轮询
+        except queue.Empty:
+            pass
+        if chunks:
+            self._show_chunks(chunks)
+        self.window.after(POLL_INTERVAL_MS, self._poll)
+
+    def _show_chunks(self, chunks):
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter() - self.started
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.status.config(text=f"正在生成报告...（首段 {self.first_chunk:.1f} 秒）")
+        self._insert("".join(chunks))
+
+    def _done(self, text):
+        self.duration = time.perf_counter() - self.started
+        self.progress.stop()
+        self.progress.pack_forget()
+        if self.first_chunk is None:
+            self._insert(text or "未找到报告内容")
+            self.status.config(text=f"报告已生成（耗时 {self.duration:.1f} 秒）")
+        else:
+            self.status.config(text=f"报告已生成（首段 {self.first_chunk:.1f} 秒，总耗时 {self.duration:.1f} 秒）")
+
+    def _error(self, message):
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.status.config(text=f"生成报告失败：{message}")
+
+    def _on_close(self):
+        self._closed = True
+        self.window.destroy()
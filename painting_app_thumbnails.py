@@ -0,0 +1,209 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from painting_app_image_cache import file_digest, load_image
+
+# 预生成的缩略图边长（像素）
+THUMB_SIZES = (64, 128, 300)
+# .thumbs 中最多保留的缩略图文件数（按最近使用时间淘汰），以及内存中记住的文件哈希数
+MAX_THUMB_FILES = 3000
+MAX_DIGESTS = 1024
+
+
+def _make_thumbnail(source, size):
+    """按最长边 size 生成缩略图：先用 draft/reduce 快速缩小，再做一次 LANCZOS"""
+    img = source
+    if img.format == 'JPEG':
+        img.draft('RGB', (size, size))  # JPEG 解码时直接按 1/2~1/8 缩小
+    if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        img = img.convert('RGBA')
+    factor = min(img.size) // (size * 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img is source:
+        img = img.copy()  # thumbnail 会原地修改，不能改动源图片
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return img
+
+
+class ThumbnailStore:
+    """保存在 save_images/.thumbs/ 下的缩略图缓存，按文件内容哈希索引"""
+
+    def __init__(self, root_dir, sizes=THUMB_SIZES, max_files=MAX_THUMB_FILES):
+        self.thumb_dir = os.path.join(root_dir, '.thumbs')
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        self.sizes = tuple(sizes)
+        self.max_files = max_files
+        self._digests = OrderedDict()  # (路径, 修改时间, 大小) -> 内容哈希，最多 MAX_DIGESTS 条
+        self._latest = OrderedDict()  # 路径 -> 最近一次已生成缩略图的内容哈希
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbs')
+
+    @staticmethod
+    def _remember(cache, key, value):
+        """写入有上限的 LRU 字典（调用方持有锁）"""
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > MAX_DIGESTS:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def _key(path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def _digest(self, path):
+        key = self._key(path)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                self._remember(self._digests, key, digest)
+        return digest
+
+    def _thumb_path(self, digest, size):
+        return os.path.join(self.thumb_dir, f"{digest}_{size}.png")
+
+    def _snap_size(self, size):
+        """选择不小于请求尺寸的最小预设尺寸"""
+        for s in sorted(self.sizes):
+            if s >= size:
+                return s
+        return max(self.sizes)
+
+    def build(self, path):
+        """为文件生成全部尺寸的缩略图，返回内容哈希"""
+        digest = self._digest(path)
+        missing = [s for s in self.sizes if not os.path.exists(self._thumb_path(digest, s))]
+        if missing:
+            from_cache = path.lower().endswith('.xcf')
+            source = load_image(path) if from_cache else Image.open(path)
+            try:
+                # 从大到小生成，每一级都以上一级结果为源，避免重复处理原图
+                current = source
+                for size in sorted(self.sizes, reverse=True):
+                    current = _make_thumbnail(current, size)
+                    if size in missing:
+                        target = self._thumb_path(digest, size)
+                        tmp_path = f"{target}.tmp"
+                        current.save(tmp_path, "PNG")
+                        os.replace(tmp_path, target)
+            finally:
+                if not from_cache:  # 缓存中的图片是共享的，不能关闭
+                    source.close()
+            logging.info(f"生成缩略图: {path}")
+            self._prune()
+        with self._lock:
+            self._remember(self._latest, os.path.abspath(path), digest)
+        return digest
+
+    def _prune(self):
+        """缩略图文件超过 max_files 时删除最久未使用的（读取时会更新修改时间）"""
+        try:
+            entries = [e for e in os.scandir(self.thumb_dir) if e.name.endswith('.png')]
+        except OSError:
+            return
+        excess = len(entries) - self.max_files
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        logging.info(f"清理缩略图缓存: 删除 {excess} 个文件")
+
+    def schedule_rebuild(self, path):
+        """源文件变化后在后台重新生成缩略图"""
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            if abs_path in self._pending:
+                return
+            self._pending.add(abs_path)
+
+        def task():
+            try:
+                self.build(path)
+            except Exception as e:
+                logging.error(f"缩略图生成失败: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(abs_path)
+
+        self._executor.submit(task)
+
+    def _open(self, thumb_path):
+        img = Image.open(thumb_path)
+        img.load()
+        try:
+            os.utime(thumb_path)  # 记录最近使用时间，供 _prune 淘汰
+        except OSError:
+            pass
+        return img
+
+    def peek(self, path, size=300):
+        """不读取原文件内容的快速路径：哈希已知且缩略图存在（或有旧缩略图可先显示）时返回图片，否则返回 None"""
+        size = self._snap_size(size)
+        key = self._key(path)
+        with self._lock:
+            digest = self._digests.get(key)
+            stale = self._latest.get(key[0])
+        if digest and os.path.exists(self._thumb_path(digest, size)):
+            return self._open(self._thumb_path(digest, size))
+        if stale and os.path.exists(self._thumb_path(stale, size)):
+            self.schedule_rebuild(path)
+            return self._open(self._thumb_path(stale, size))
+        return None
+
+    def get(self, path, size=300):
+        """获取缩略图；源文件已变化但新缩略图未生成时先返回旧图并后台重建"""
+        img = self.peek(path, size)
+        if img is not None:
+            return img
+        size = self._snap_size(size)
+        digest = self.build(path)
+        return self._open(self._thumb_path(digest, size))
+
+    def get_async(self, path, callback, size=300):
+        """获取缩略图而不阻塞界面线程：命中时立即调用 callback(img, None)，
+        否则在后台计算哈希并生成缩略图，完成后在后台线程调用 callback(img, error)"""
+        try:
+            img = self.peek(path, size)
+        except Exception as e:
+            callback(None, e)
+            return
+        if img is not None:
+            callback(img, None)
+            return
+
+        def task():
+            try:
+                img = self.get(path, size)
+            except Exception as e:
+                callback(None, e)
+            else:
+                callback(img, None)
+
+        self._executor.submit(task)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_thumbnail_store(root_dir):
+    """获取指定目录的缩略图存储（每个目录共享一个实例）"""
+    root_dir = os.path.abspath(root_dir)
+    with _stores_lock:
+        store = _stores.get(root_dir)
+        if store is None:
+            store = _stores[root_dir] = ThumbnailStore(root_dir)
+        return store
@@ -0,0 +1,182 @@
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+
+INDEX_NAME = 'tiles.json'
+# 关键帧 PNG 的压缩级别（0~9，越小越快、文件越大）
+KEYFRAME_PNG_COMPRESS_LEVEL = 1
+
+
+def _to_array(img):
+    """统一成 L/RGB/RGBA 三种模式的 uint8 数组"""
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    arr = np.asarray(img)
+    if arr.ndim == 2:
+        arr = arr[..., None]
+    return img.mode, arr
+
+
+def _from_array(mode, arr):
+    return Image.fromarray(arr[..., 0] if mode == 'L' else arr, mode)
+
+
+class TileDeltaHistory:
+    """按固定大小分块存储版本历史：每隔 keyframe_interval 个版本保存完整关键帧，
+    其余版本只保存相对上一版本发生变化的图块。
+
+    目录结构：
+        tiles.json        版本索引
+        k0001.png         关键帧
+        d0002.npz         差分帧（变化图块的编号和像素）
+    """
+
+    def __init__(self, directory, tile_size=64, keyframe_interval=16, compress_level=KEYFRAME_PNG_COMPRESS_LEVEL):
+        self.directory = directory
+        self.compress_level = compress_level
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._lock = threading.Lock()
+        self._last = None  # (版本号, 模式, 数组)：最近一个版本的完整画面
+        # 每保存一个版本调用 listener(entry, index, tiles, grid_shape, reset)，只传入变化的图块
+        self.listeners = []
+        index = self._load_index()
+        self.tile_size = index.get("tile_size", tile_size)
+        self.keyframe_interval = index.get("keyframe_interval", keyframe_interval)
+        self._versions = index.get("versions", [])
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"tile_size": self.tile_size,
+                       "keyframe_interval": self.keyframe_interval,
+                       "versions": self._versions}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _pad(self, arr):
+        """补齐到图块的整数倍（已对齐时原样返回），补齐部分填白色"""
+        t = self.tile_size
+        h, w, c = arr.shape
+        th, tw = -(-h // t), -(-w // t)
+        if (th * t, tw * t) == (h, w):
+            return arr
+        padded = np.full((th * t, tw * t, c), 255, dtype=arr.dtype)
+        padded[:h, :w] = arr
+        return padded
+
+    def _tile_grid(self, padded):
+        """切分为 (行, 列, T, T, C) 的视图，修改视图即修改原数组"""
+        t = self.tile_size
+        h, w, c = padded.shape
+        return padded.reshape(h // t, t, w // t, t, c).swapaxes(1, 2)
+
+    def __len__(self):
+        return len(self._versions)
+
+    def list_versions(self):
+        with self._lock:
+            return [dict(v) for v in self._versions]
+
+    def append(self, img):
+        """追加一个版本；与上一版本像素完全相同时返回 None"""
+        mode, arr = _to_array(img)
+        with self._lock:
+            number = len(self._versions) + 1
+            prev = self._last_frame()
+            reset = prev is None or prev[1] != mode or prev[2].shape != arr.shape
+            need_key = reset or (number - 1) % self.keyframe_interval == 0
+            new_grid = self._tile_grid(self._pad(arr))
+            if reset:
+                changed = np.ones(new_grid.shape[:2], dtype=bool)
+            else:
+                old_grid = self._tile_grid(self._pad(prev[2]))
+                changed = (old_grid != new_grid).any(axis=(2, 3, 4))
+            tiles = int(np.count_nonzero(changed))
+            if tiles == 0:
+                return None
+            index = np.flatnonzero(changed).astype(np.int32)
+            changed_tiles = new_grid[changed]
+            if need_key:
+                name = f"k{number:04d}.png"
+                path = os.path.join(self.directory, name)
+                _from_array(mode, arr).save(path, "PNG", compress_level=self.compress_level)
+            else:
+                name = f"d{number:04d}.npz"
+                path = os.path.join(self.directory, name)
+                np.savez_compressed(path, index=index, tiles=changed_tiles)
+            entry = {
+                "version": number,
+                "kind": "key" if need_key else "delta",
+                "file": name,
+                "size": [arr.shape[1], arr.shape[0]],
+                "mode": mode,
+                "tiles": tiles,
+                "bytes": os.path.getsize(path),
+            }
+            self._versions.append(entry)
+            self._save_index()
+            self._last = (number, mode, arr)
+        logging.info(f"分块版本保存: {name}（{entry['bytes']} 字节）")
+        for listener in self.listeners:
+            try:
+                listener(entry, index, changed_tiles, changed.shape, reset)
+            except Exception as e:
+                logging.error(f"版本监听回调失败: {str(e)}")
+        return entry
+
+    def _last_frame(self):
+        if not self._versions:
+            return None
+        number = self._versions[-1]["version"]
+        if self._last is None or self._last[0] != number:
+            mode, arr = self._reconstruct_array(number)
+            self._last = (number, mode, arr)
+        return self._last
+
+    def _reconstruct_array(self, version):
+        entry = self._versions[version - 1]
+        # 找到不晚于目标版本的最近关键帧，再依次叠加差分
+        start = version
+        while self._versions[start - 1]["kind"] != "key":
+            start -= 1
+        key = self._versions[start - 1]
+        with Image.open(os.path.join(self.directory, key["file"])) as img:
+            mode, arr = _to_array(img)
+        h, w = arr.shape[:2]
+        padded = self._pad(arr)
+        if padded is arr:
+            padded = arr.copy()  # np.asarray 得到的数组是只读的
+        grid = self._tile_grid(padded)
+        tw = grid.shape[1]
+        for number in range(start + 1, version + 1):
+            with np.load(os.path.join(self.directory, self._versions[number - 1]["file"])) as delta:
+                index, tiles = delta["index"], delta["tiles"]
+            grid[index // tw, index % tw] = tiles
+        arr = padded[:h, :w]
+        return entry["mode"], np.ascontiguousarray(arr)
+
+    def reconstruct(self, version):
+        """随机读取任意版本，最多叠加 keyframe_interval - 1 个差分"""
+        with self._lock:
+            if not 1 <= version <= len(self._versions):
+                raise IndexError(f"版本不存在: {version}")
+            if self._last is not None and self._last[0] == version:
+                mode, arr = self._last[1], self._last[2]
+            else:
+                mode, arr = self._reconstruct_array(version)
+        return _from_array(mode, arr)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(v["bytes"] for v in self._versions)
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk
 
 from painting_app_file_handling import _load_history, start_painting
+from painting_app_history_panel import HistoryPanel
 from painting_app_status_indicator import StatusIndicator
 
 
@@ -10,11 +11,8 @@ def _setup_ui(app):
     app.master.geometry("800x600")
     # 历史记录面板
     history_frame = ttk.LabelFrame(app.master, text="历史分析报告")
-    scrollbar = tk.Scrollbar(history_frame)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-    app.history_text = tk.Text(history_frame, height=8, yscrollcommand=scrollbar.set, state=tk.DISABLED)
-    app.history_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-    scrollbar.config(command=app.history_text.yview)
+    app.history_panel = HistoryPanel(history_frame, app.db, app.user_id)
+    app.history_panel.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
     history_frame.pack(fill=tk.BOTH, padx=10, pady=5)
 
     # 文件信息面板
@@ -0,0 +1,64 @@
+import io
+import os
+import logging
+
+from PIL import Image, features
+
+from painting_app_image_cache import load_image
+
+# 上传给视觉模型前的预处理参数：最长边、格式（JPEG / WEBP）和压缩质量
+UPLOAD_MAX_SIZE = (1280, 1280)
+UPLOAD_FORMAT = 'JPEG'
+UPLOAD_QUALITY = 85
+
+_MIME_TYPES = {'JPEG': ('image/jpeg', '.jpg'), 'WEBP': ('image/webp', '.webp')}
+
+
+def _flatten(img):
+    """透明背景合成到白色画布上（JPEG 不支持透明通道，否则透明处会变黑）"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def prepare_upload_image(path, max_size=UPLOAD_MAX_SIZE, fmt=UPLOAD_FORMAT, quality=UPLOAD_QUALITY):
+    """缩小并重新压缩要上传的绘画，返回 (数据, 文件名, MIME 类型)
+
+    在后台线程中调用。先按整数倍 reduce 再做一次 LANCZOS 缩放；
+    如果处理后反而比原文件大且原图尺寸不超限，直接上传原文件。
+    """
+    fmt = fmt.upper()
+    if fmt == 'WEBP' and not features.check('webp'):
+        logging.warning("当前 Pillow 不支持 WebP，改用 JPEG")
+        fmt = 'JPEG'
+    original_size = os.path.getsize(path)
+    img = load_image(path)
+    within_limit = img.width <= max_size[0] and img.height <= max_size[1]
+
+    small = _flatten(img)
+    if small is img:
+        small = img.copy()  # 缓存中的图片是共享的，不能原地缩放
+    small.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    options = {'quality': quality}
+    if fmt == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+    small.save(buffer, fmt, **options)
+    data = buffer.getvalue()
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    ext = os.path.splitext(path)[1].lower()
+    if within_limit and ext in ('.png', '.jpg', '.jpeg') and original_size <= len(data):
+        logging.info(f"上传原图: {path}（{original_size} 字节，预处理后反而更大）")
+        with open(path, 'rb') as f:
+            return f.read(), os.path.basename(path), 'image/png' if ext == '.png' else 'image/jpeg'
+
+    mime, suffix = _MIME_TYPES[fmt]
+    logging.info(f"上传预处理: {path} {img.width}x{img.height} {original_size} 字节 -> "
+                 f"{small.width}x{small.height} {fmt} {len(data)} 字节（{len(data) / original_size:.0%}）")
+    return data, f"{name}{suffix}", mime
@@ -0,0 +1,166 @@
+import os
+import json
+import shutil
+import logging
+import threading
+from datetime import datetime
+
+from PIL import Image
+
+from painting_app_image_cache import file_digest
+from painting_app_tile_delta import TileDeltaHistory
+
+MANIFEST_NAME = 'manifest.json'
+# 无损位图格式按图块差分保存，其余格式（xcf/kra/jpg 等）按整文件去重保存
+TILE_DELTA_FORMATS = ('.png', '.bmp', '.tif', '.tiff')
+
+
+class VersionStore:
+    """按内容哈希去重的版本存储
+
+    内容只在 save_images/.objects/ 下保存一份，版本目录中的 *_vNNN 文件是指向它的硬链接，
+    manifest.json 记录每个版本对应的哈希。与上一版本内容相同的快照不会产生任何写入。
+    开启 tile_delta 时，PNG/TIFF 等无损位图改为保存到版本目录的 .tiles/ 下，只记录变化的图块。
+    """
+
+    def __init__(self, backup_dir, objects_dir=None, tile_delta=True):
+        self.backup_dir = backup_dir
+        self.objects_dir = objects_dir or os.path.join(os.path.dirname(os.path.abspath(backup_dir)), '.objects')
+        self.manifest_path = os.path.join(backup_dir, MANIFEST_NAME)
+        os.makedirs(self.backup_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._versions = self._load_manifest()
+        self.tile_delta = tile_delta
+        self._tiles = None
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)["versions"]
+        except FileNotFoundError:
+            return []
+        except (json.JSONDecodeError, KeyError) as e:
+            logging.error(f"版本清单损坏，重新建立: {str(e)}")
+            return []
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"versions": self._versions}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def tiles(self):
+        """版本目录下的分块差分历史（首次使用时创建）"""
+        if self._tiles is None:
+            self._tiles = TileDeltaHistory(os.path.join(self.backup_dir, '.tiles'))
+        return self._tiles
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{ext}")
+
+    def _store_blob(self, file_path, digest, ext):
+        """内容不存在时才写入对象目录"""
+        blob_path = self._blob_path(digest, ext)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, blob_path)
+        return blob_path
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        """优先创建硬链接，文件系统不支持时退回复制"""
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def add(self, file_path, label='v'):
+        """保存一个版本；内容与上一版本相同时返回 None，不产生写入"""
+        digest = file_digest(file_path)
+        name, ext = os.path.splitext(os.path.basename(file_path))
+        with self._lock:
+            if self._versions and self._versions[-1]["hash"] == digest:
+                return None
+            number = len(self._versions) + 1
+            version_name = f"{name}_{label}{number:03d}{ext}"
+            if self.tile_delta and ext.lower() in TILE_DELTA_FORMATS:
+                with Image.open(file_path) as img:
+                    tile_entry = self.tiles.append(img)
+                if tile_entry is None:
+                    return None  # 文件字节不同但像素完全相同
+                entry = {
+                    "version": number,
+                    "name": version_name,
+                    "hash": digest,
+                    "ext": ext,
+                    "kind": "tiles",
+                    "tile_version": tile_entry["version"],
+                    "size": tile_entry["bytes"],
+                    "time": datetime.now().isoformat(),
+                }
+            else:
+                blob_path = self._store_blob(file_path, digest, ext)
+                self._link_or_copy(blob_path, os.path.join(self.backup_dir, version_name))
+                entry = {
+                    "version": number,
+                    "name": version_name,
+                    "hash": digest,
+                    "ext": ext,
+                    "kind": "blob",
+                    "size": os.path.getsize(blob_path),
+                    "time": datetime.now().isoformat(),
+                }
+            self._versions.append(entry)
+            self._save_manifest()
+        logging.info(f"保存版本: {version_name} ({digest[:12]})")
+        return entry
+
+    def list_versions(self):
+        """列出本次会话的全部版本"""
+        with self._lock:
+            return [dict(v) for v in self._versions]
+
+    def blob_path(self, version):
+        """返回整文件保存的版本的内容文件路径（只读）"""
+        entry = self._versions[version - 1]
+        if entry.get("kind") == "tiles":
+            raise ValueError(f"版本 {version} 以图块差分保存，请使用 load 或 materialize")
+        return self._blob_path(entry["hash"], entry["ext"])
+
+    def load(self, version):
+        """读取指定版本为 PIL 图像"""
+        entry = self._versions[version - 1]
+        if entry.get("kind") == "tiles":
+            return self.tiles.reconstruct(entry["tile_version"])
+        img = Image.open(self.blob_path(version))
+        img.load()
+        return img
+
+    def materialize(self, version, dest_path):
+        """把指定版本恢复为一个独立文件"""
+        entry = self._versions[version - 1]
+        if entry.get("kind") == "tiles":
+            self.tiles.reconstruct(entry["tile_version"]).save(dest_path)
+        else:
+            shutil.copyfile(self.blob_path(version), dest_path)
+        return dest_path
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_version_store(backup_dir):
+    """获取版本目录对应的存储（监控线程和自动保存线程共用同一个实例）"""
+    backup_dir = os.path.abspath(backup_dir)
+    with _stores_lock:
+        store = _stores.get(backup_dir)
+        if store is None:
+            store = _stores[backup_dir] = VersionStore(backup_dir)
+        return store
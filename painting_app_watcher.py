@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import threading
+
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+from watchdog.events import FileSystemEventHandler
+
+
+class FileChangeHandler(FileSystemEventHandler):
+    def __init__(self, directory, callback):
+        self.directory = directory
+        self.callback = callback
+
+    def on_modified(self, event):
+        self.callback(event)
+
+    def on_created(self, event):
+        self.callback(event)
+
+    def on_moved(self, event):
+        # 很多绘画软件先写临时文件再重命名覆盖原文件
+        self.callback(event)
+
+
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+class DebouncedFileWatcher:
+    """基于 watchdog 的文件监控：同一文件的连续写入合并，文件静止 quiet_period 秒后只回调一次
+
+    系统不支持原生文件事件（inotify 等）时退回轮询。
+    """
+
+    def __init__(self, callback, quiet_period=1.0, poll_interval=1.0):
+        self.callback = callback
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self._targets = {}  # 目录 -> 需要关注的文件绝对路径集合（空集合表示目录下全部文件）
+        self._pending = {}  # 路径 -> (最后一次事件时间, 文件签名)
+        self._cond = threading.Condition()
+        self._running = False
+        self._observer = None
+        self._thread = None
+
+    def watch(self, path):
+        """关注一个文件或一个目录"""
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            self._targets.setdefault(path, set())
+        else:
+            self._targets.setdefault(os.path.dirname(path), set()).add(path)
+
+    def _make_observer(self, observer_cls):
+        observer = observer_cls(timeout=self.poll_interval) if observer_cls is PollingObserver else observer_cls()
+        for directory in self._targets:
+            observer.schedule(FileChangeHandler(directory, self._on_event), directory, recursive=False)
+        observer.start()
+        return observer
+
+    def start(self):
+        self._running = True
+        try:
+            self._observer = self._make_observer(Observer)
+        except OSError as e:
+            logging.warning(f"原生文件监控不可用，改为轮询: {str(e)}")
+            self._observer = self._make_observer(PollingObserver)
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._observer:
+            self._observer.stop()
+
+    def join(self, timeout=None):
+        if self._observer:
+            self._observer.join(timeout)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _on_event(self, event):
+        if event.is_directory:
+            return
+        path = os.path.abspath(getattr(event, 'dest_path', '') or event.src_path)
+        targets = self._targets.get(os.path.dirname(path))
+        if targets is None or (targets and path not in targets):
+            return
+        with self._cond:
+            self._pending[path] = (time.monotonic(), _stat_signature(path))
+            self._cond.notify_all()
+
+    def _dispatch_loop(self):
+        while True:
+            ready = []
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                wait = None
+                for path, (last_event, signature) in list(self._pending.items()):
+                    remaining = last_event + self.quiet_period - now
+                    if remaining > 0:
+                        wait = remaining if wait is None else min(wait, remaining)
+                        continue
+                    current = _stat_signature(path)
+                    if current != signature:
+                        # 静默期内文件仍在变化（事件可能被合并丢失），重新计时
+                        self._pending[path] = (now, current)
+                        wait = self.quiet_period if wait is None else min(wait, self.quiet_period)
+                        continue
+                    del self._pending[path]
+                    if current is not None:
+                        ready.append(path)
+                if not ready:
+                    self._cond.wait(wait)
+                    continue
+            for path in ready:
+                try:
+                    self.callback(path)
+                except Exception as e:
+                    logging.error(f"文件变化回调失败: {str(e)}")
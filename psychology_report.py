@@ -1,85 +1,106 @@
 import os
 import requests
-import json
+from painting_app_features import format_features
+from painting_app_image_cache import SUPPORTED_FORMATS, file_digest
+from painting_app_upload_prep import prepare_upload_image
+from qianfan_client import get_client
+from report_cache import drawing_key, get_report_cache
 app_id = "d1534299-f286-48b6-98e8-f98594b36336"
-with open('token.txt', 'r') as file:
-    token = file.read().strip() 
-def generate_psychology_report():
-     # ------------------新建对话------------------
-
-    url = "https://qianfan.baidubce.com/v2/app/conversation"
-    
-    payload = json.dumps({
-        "app_id": app_id,
-    }, ensure_ascii=False)
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.request("POST", url, headers=headers, data=payload.encode("utf-8"))
-    
-    conversation_id = response.json().get("conversation_id")
-    print("Conversation ID:", conversation_id)
-    
-    # ------------------上传逻辑------------------
-# 在这中间可以修改选择哪张照片↓↓↓↓↓↓↓↓↓↓↓↓
-    # 找到 images 文件夹下最新的图片
-    images_folder = 'save_images'
+# 可以上传的绘画格式（上传前统一缩小并转成 JPEG/WebP）
+UPLOAD_FORMATS = SUPPORTED_FORMATS
+
+
+def _latest_image(images_folder='save_images'):
+    """找到 images 文件夹下最新的图片"""
     if not os.path.exists(images_folder):
         print(f"错误: 文件夹 {images_folder} 不存在。")
         return None
     image_files = [os.path.join(images_folder, f) for f in os.listdir(images_folder) if
-                   f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+                   f.lower().endswith(UPLOAD_FORMATS)]
     if not image_files:
         print("错误: images 文件夹中没有图片文件。")
         return None
-    latest_image = max(image_files, key=os.path.getctime)
-# 在这中间可以修改选择哪张照片↑↑↑↑↑↑↑↑↑↑↑↑↑↑↑↑↑
-    image_upload_url = "https://qianfan.baidubce.com/v2/app/conversation/file/upload"
-    
-    payload = {
-        'app_id': app_id,
-        'conversation_id': conversation_id,
-    }
-    headers = {
-        'Authorization': f'Bearer {token}',
-    }
-
-    with open(latest_image, 'rb') as img_file:
-        response = requests.post(image_upload_url, headers=headers, data=payload, files={'file': img_file})
-    print("文件上传响应:", response.text)
-    file_id = response.json().get("id")
-    # ------------------上传图片------------------
+    return max(image_files, key=os.path.getctime)
+
+
+def _resolve_image(image_path=None):
+    """要上传的图片：没有指定（或格式无法解码）时使用 save_images 下最新的图片"""
+    if not image_path or not image_path.lower().endswith(UPLOAD_FORMATS):
+        return _latest_image()
+    return image_path
+
+
+def prepare_drawing_upload(image_path=None, conversation_id=None):
+    """新建对话（或使用预建的 conversation_id）并上传绘画，返回 (conversation_id, file_id)；可以在用户答题时提前执行"""
+    client = get_client()
+    # ------------------新建对话------------------
+    conversation_id = conversation_id or client.create_conversation(app_id)
+    print("Conversation ID:", conversation_id)
+
     # ------------------上传逻辑------------------
-    # ------------------调用工作流逻辑------------------
-    if file_id:
-            try:
-                url = "https://qianfan.baidubce.com/v2/app/conversation/runs"
-                
-                payload = json.dumps({
-                    "app_id": app_id,
-                    "query": "这是我的绘画，请帮我分析一下我的心理状态",
-                    "conversation_id": conversation_id,
-                    "stream": False,
-                    "file_ids": [
-                        response.json().get("id")
-                    ]
-                }, ensure_ascii=False)
-                headers = {
-                    'Authorization': f'Bearer {token}',
-                    'Content-Type': 'application/json'
-                    
-                }
-                
-                response = requests.request("POST", url, headers=headers, data=payload.encode("utf-8"))
-                print(response.text)
-                return response.json().get("answer")
-            # ------------------调用工作流逻辑------------------
-
-            except requests.RequestException as e:
-                print(f"错误: 对话时发生请求错误: {e}")
-                return None
-    else:
-        print("错误: 文件上传失败，未获取到 file_id。")
-        return None
\ No newline at end of file
+    image_path = _resolve_image(image_path)
+    if image_path is None:
+        return conversation_id, None
+    data, filename, content_type = prepare_upload_image(image_path)
+    upload = client.upload_data(app_id, conversation_id, data, filename, content_type)
+    print("文件上传响应:", upload)
+    return conversation_id, upload.get("id")
+
+
+def drawing_digest(image_path=None):
+    """实际要上传的图片及其内容哈希 (路径, 哈希)；没有图片时返回 (None, None)"""
+    image_path = _resolve_image(image_path)
+    if image_path is None:
+        return None, None
+    return image_path, file_digest(image_path)
+
+
+def has_cached_report(image_path=None, image_hash=None):
+    """这张图片是否已有缓存的绘画报告（有则不必预上传）；已算好的 image_hash 可直接传入"""
+    if image_hash is None:
+        image_path, image_hash = drawing_digest(image_path)
+    return image_hash is not None and get_report_cache().has_image(image_hash, app_id)
+
+
+def generate_psychology_report(features=None, on_chunk=None, prepared=None, image_path=None, use_cache=True,
+                               conversation_id=None, image_hash=None):
+    """生成绘画分析报告；回答以流式返回，每收到一段文字调用 on_chunk(text)
+
+    prepared 为 prepare_drawing_upload 提前得到的 (conversation_id, file_id)，没有时现场上传
+    （使用预建的 conversation_id，没有则新建对话）。
+    同一张图片、同一提示词的报告直接从缓存返回（use_cache=False 时跳过缓存）；
+    image_hash 为 drawing_digest 已算好的图片哈希，传入时不再重新读取整个文件。
+    """
+    query = "这是我的绘画，请帮我分析一下我的心理状态"
+    if features:
+        # 附上本地提取的绘画特征，供模型参考
+        query += f"。以下是程序提取的画面特征：\n{format_features(features)}"
+    image_path = _resolve_image(image_path)
+    if image_path is None:
+        return None
+
+    cache = get_report_cache()
+    image_hash = image_hash or file_digest(image_path)
+    key = drawing_key(image_hash, app_id, query)
+    if use_cache:
+        cached = cache.get(key)
+        if cached:
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+
+    client = get_client()
+    try:
+        conversation_id, file_id = prepared or prepare_drawing_upload(image_path, conversation_id)
+        if not file_id:
+            print("错误: 文件上传失败，未获取到 file_id。")
+            return None
+
+        # ------------------调用工作流逻辑------------------
+        answer, stats = client.run_stream(app_id, conversation_id, query, [file_id], on_chunk)
+        print(f"报告生成完成: 首字 {stats['ttft'] or 0:.2f} s，总耗时 {stats['duration']:.2f} s")
+        cache.put(key, answer, "drawing", app_id, image_hash)
+        return answer
+    except requests.RequestException as e:
+        print(f"错误: 对话时发生请求错误: {e}")
+        return None
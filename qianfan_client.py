@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://qianfan.baidubce.com/v2/app"
+TOKEN_PATH = 'token.txt'
+# 建立连接的超时时间；读取超时要覆盖大模型生成整份报告的时间
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 180
+
+
+def iter_sse_events(lines):
+    """把 SSE 响应的逐行字节解析为 JSON 事件（同一事件的多行 data 会拼接）"""
+    data = []
+    for line in lines:
+        line = line.decode('utf-8') if isinstance(line, bytes) else line
+        if not line:
+            if data:
+                yield _parse_event("\n".join(data))
+                data = []
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+    if data:
+        yield _parse_event("\n".join(data))
+
+
+def _parse_event(data):
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        logging.warning(f"无法解析的流式事件: {data[:200]}")
+        return {}
+
+
+class QianfanClient:
+    """千帆应用 API 客户端
+
+    所有调用共用一个 requests.Session（连接池 + keep-alive），令牌只读取一次，
+    每次请求都有连接/读取超时，并记录耗时。
+    """
+
+    def __init__(self, token=None, token_path=TOKEN_PATH, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, pool_size=4):
+        self._token = token
+        self.token_path = token_path
+        self.timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    @property
+    def token(self):
+        """第一次使用时从 token.txt 读取"""
+        if self._token is None:
+            with self._lock:
+                if self._token is None:
+                    with open(self.token_path, 'r') as file:
+                        self._token = file.read().strip()
+        return self._token
+
+    def request(self, method, path, **kwargs):
+        """发送请求并记录耗时；HTTP 错误抛出 requests.HTTPError"""
+        headers = kwargs.pop('headers', {})
+        headers['Authorization'] = f'Bearer {self.token}'
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{BASE_URL}/{path}", headers=headers, **kwargs)
+        except requests.RequestException as e:
+            logging.error(f"千帆请求失败 {path}: {str(e)}（{(time.perf_counter() - start) * 1000:.0f} ms）")
+            raise
+        logging.info(f"千帆请求 {path}: {response.status_code}，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+        response.raise_for_status()
+        return response
+
+    def post_json(self, path, payload, **kwargs):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return self.request("POST", path, data=data, headers={'Content-Type': 'application/json'}, **kwargs)
+
+    def create_conversation(self, app_id):
+        """新建对话，返回 conversation_id"""
+        return self.post_json("conversation", {"app_id": app_id}).json().get("conversation_id")
+
+    def upload_file(self, app_id, conversation_id, file_path):
+        """上传文件到对话，返回上传接口的完整响应"""
+        with open(file_path, 'rb') as f:
+            return self.upload_data(app_id, conversation_id, f, os.path.basename(file_path))
+
+    def upload_data(self, app_id, conversation_id, data, filename, content_type=None):
+        """上传内存中的数据（或已打开的文件）到对话，返回上传接口的完整响应"""
+        file_field = (filename, data, content_type) if content_type else (filename, data)
+        response = self.request("POST", "conversation/file/upload",
+                                data={'app_id': app_id, 'conversation_id': conversation_id},
+                                files={'file': file_field})
+        return response.json()
+
+    def run(self, app_id, conversation_id, query, file_ids=None):
+        """发送消息（非流式），返回完整响应"""
+        payload = {
+            "app_id": app_id,
+            "query": query,
+            "conversation_id": conversation_id,
+            "stream": False,
+        }
+        if file_ids:
+            payload["file_ids"] = list(file_ids)
+        return self.post_json("conversation/runs", payload).json()
+
+    def run_stream(self, app_id, conversation_id, query, file_ids=None, on_chunk=None):
+        """流式发送消息：逐个解析 SSE 事件，每收到一段文字就调用 on_chunk(text)
+
+        返回 (完整回答, 统计)，统计包含首字延迟 ttft、总耗时 duration（秒）和片段数 chunks。
+        """
+        payload = {
+            "app_id": app_id,
+            "query": query,
+            "conversation_id": conversation_id,
+            "stream": True,
+        }
+        if file_ids:
+            payload["file_ids"] = list(file_ids)
+        start = time.perf_counter()
+        ttft = None
+        parts = []
+        response = self.post_json("conversation/runs", payload, stream=True)
+        with response:
+            for event in iter_sse_events(response.iter_lines()):
+                if event.get("code"):
+                    raise requests.HTTPError(f"千帆流式响应错误: {event.get('code')} {event.get('message')}")
+                text = event.get("answer") or ""
+                if text:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    parts.append(text)
+                    if on_chunk:
+                        on_chunk(text)
+                if event.get("is_completion"):
+                    break
+        stats = {"ttft": ttft, "duration": time.perf_counter() - start, "chunks": len(parts)}
+        logging.info(f"千帆流式回答: 首字 {(ttft or 0) * 1000:.0f} ms，总耗时 {stats['duration'] * 1000:.0f} ms，"
+                     f"{len(parts)} 段")
+        return "".join(parts), stats
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共享的客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = QianfanClient()
+        return _client
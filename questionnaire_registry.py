@@ -0,0 +1,199 @@
+import os
+import sys
+import glob
+import json
+import pickle
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# 编译缓存格式变化时递增，旧缓存自动作废
+CACHE_VERSION = 2
+CACHE_NAME = '.questionnaires.cache'
+# 仅用于测试的题库，不注册为正式问卷
+EXCLUDED_FILES = frozenset({'test.json'})
+
+# 编译后的问卷：questions 为只读题目列表，option_scores 为 (题数, 最多选项数) 的原始选项分值
+QuestionnaireDefinition = namedtuple('QuestionnaireDefinition', ['name', 'questions', 'option_scores'])
+
+
+class QuestionnaireError(ValueError):
+    """题库文件格式错误"""
+
+
+class _FrozenDict(dict):
+    """只读字典：题库在所有窗口间共享，禁止修改"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("题库定义是只读的")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return _FrozenDict, (dict(self),)
+
+
+class _FrozenList(list):
+    """只读列表：仍然是 list，界面和计分代码按列表判断题型"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("题库定义是只读的")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __reduce__(self):
+        return _FrozenList, (list(self),)
+
+
+def _base_path():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def _intern(value):
+    """递归驻留字符串并冻结容器"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return _FrozenDict((sys.intern(k), _intern(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return _FrozenList(_intern(v) for v in value)
+    return value
+
+
+def validate_questions(name, questions):
+    """检查题库结构，出错时抛出 QuestionnaireError"""
+    if not isinstance(questions, list):
+        raise QuestionnaireError(f"{name}: 顶层应为题目列表")
+    for i, q in enumerate(questions, start=1):
+        if not isinstance(q, dict) or not isinstance(q.get("question"), str):
+            raise QuestionnaireError(f"{name}: 第 {i} 题缺少 question")
+        options = q.get("options")
+        if q.get("type") == "text":
+            continue
+        if not isinstance(options, list) or not options:
+            raise QuestionnaireError(f"{name}: 第 {i} 题缺少 options")
+        if q.get("type") == "checkbox":
+            continue
+        letters = set()
+        for opt in options:
+            if not isinstance(opt, dict) or not {"option", "description", "score"} <= opt.keys():
+                raise QuestionnaireError(f"{name}: 第 {i} 题的选项缺少 option/description/score")
+            if not isinstance(opt["score"], (int, float)):
+                raise QuestionnaireError(f"{name}: 第 {i} 题选项 {opt['option']} 的分值不是数字")
+            if opt["option"] in letters:
+                raise QuestionnaireError(f"{name}: 第 {i} 题选项 {opt['option']} 重复")
+            letters.add(opt["option"])
+
+
+def compile_definition(name, questions):
+    """校验并编译为只读的紧凑结构"""
+    validate_questions(name, questions)
+    questions = _intern(questions)
+    n_options = max((len(q.get("options") or ()) for q in questions), default=0)
+    option_scores = np.zeros((len(questions), n_options), dtype=np.float32)
+    for i, q in enumerate(questions):
+        if q.get("type") in ("text", "checkbox"):
+            continue
+        scores = [opt["score"] for opt in q["options"]]
+        option_scores[i, :len(scores)] = scores
+    option_scores.setflags(write=False)
+    return QuestionnaireDefinition(name, questions, option_scores)
+
+
+class QuestionnaireRegistry:
+    """题库注册表：data/*.json 只解析一次，编译结果按文件 mtime 缓存到磁盘，所有窗口共享同一份只读数据"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.cache_path = os.path.join(data_dir, CACHE_NAME)
+        self._lock = threading.Lock()
+        self._definitions = {}
+        self._signatures = {}
+        self.reload_if_changed()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get("version") == CACHE_VERSION:
+                return cache["files"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"题库缓存无法读取，重新编译: {str(e)}")
+        return {}
+
+    def _save_cache(self, files):
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({"version": CACHE_VERSION, "files": files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.warning(f"题库缓存写入失败: {str(e)}")
+
+    def reload_if_changed(self):
+        """重新检查 data/*.json，只编译新增或修改过的文件"""
+        with self._lock:
+            cached = None
+            definitions, signatures, changed = {}, {}, False
+            for path in sorted(glob.glob(os.path.join(self.data_dir, '*.json'))):
+                name = os.path.basename(path)
+                if name in EXCLUDED_FILES:
+                    continue
+                st = os.stat(path)
+                signature = (st.st_mtime_ns, st.st_size)
+                if self._signatures.get(name) == signature:
+                    definitions[name] = self._definitions[name]
+                    signatures[name] = signature
+                    continue
+                if cached is None:
+                    cached = self._load_cache()
+                entry = cached.get(name)
+                if entry and entry["signature"] == signature:
+                    definition = entry["definition"]
+                    definition.option_scores.setflags(write=False)
+                else:
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            definition = compile_definition(name, json.load(f))
+                    except (json.JSONDecodeError, QuestionnaireError) as e:
+                        logging.error(f"题库无效，已跳过: {name}: {str(e)}")
+                        continue
+                    changed = True
+                definitions[name] = definition
+                signatures[name] = signature
+            if cached is not None and (changed or set(cached) != set(definitions)):
+                self._save_cache({name: {"signature": signatures[name], "definition": definitions[name]}
+                                  for name in definitions})
+            self._definitions = definitions
+            self._signatures = signatures
+
+    def names(self):
+        return list(self._definitions)
+
+    def get(self, name):
+        """按文件名（如 'BDI.json'）获取编译后的题库，不存在时抛出 KeyError"""
+        return self._definitions[os.path.basename(name)]
+
+    def questions(self, name):
+        return self.get(name).questions
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_questionnaire_registry(data_dir=None):
+    """获取题库注册表（进程内共享一个实例）"""
+    data_dir = os.path.abspath(data_dir or os.path.join(_base_path(), 'data'))
+    with _registries_lock:
+        registry = _registries.get(data_dir)
+        if registry is None:
+            registry = _registries[data_dir] = QuestionnaireRegistry(data_dir)
+        return registry
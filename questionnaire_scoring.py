@@ -0,0 +1,228 @@
+import re
+import json
+import logging
+import threading
+
+import numpy as np
+
+from questionnaire_registry import get_questionnaire_registry
+
+# 问卷顺序与 QuestionnaireWindow 中一致，答案字典的键就是这里的下标
+# prekeyed 表示反向计分题的选项分值在题库中已经反转，计分时不再处理
+QUESTIONNAIRES = (
+    {"key": "big_five", "name": "大五人格测试", "file": "data/1.json", "prekeyed": False},
+    {"key": "bdi", "name": "贝克抑郁量表", "file": "data/BDI.json", "prekeyed": False},
+    {"key": "stai", "name": "状态特质焦虑量表", "file": "data/STAY.json", "prekeyed": True},
+)
+_QUESTIONNAIRE_INDEX = {q["key"]: i for i, q in enumerate(QUESTIONNAIRES)}
+# 状态特质焦虑量表前 20 题为状态焦虑，后 20 题为特质焦虑（反向题的分值在题库中已经反转）
+STAI_STATE_ITEMS = 20
+
+_FACTOR_CODE = re.compile(r'([A-Z])）\s*$')
+# 未作答的题目在响应矩阵中用 -1 表示
+MISSING = -1
+
+
+def _definition(index):
+    """从题库注册表取编译好的题库，文件缺失或无效时返回 None"""
+    name = QUESTIONNAIRES[index]["file"]
+    try:
+        return get_questionnaire_registry().get(name)
+    except KeyError:
+        logging.error(f"题库不存在或无效: {name}")
+        return None
+
+
+def load_questionnaire(index):
+    """题目列表（注册表中共享的只读数据）"""
+    definition = _definition(index)
+    return definition.questions if definition else ()
+
+
+def _question_lookup(index):
+    """题目文本 -> (题号, 题目定义)"""
+    return compile_questionnaire(index).lookup
+
+
+def factor_code(category):
+    """'神经质（Neuroticism, N）' -> 'N'"""
+    match = _FACTOR_CODE.search(category or '')
+    return match.group(1) if match else None
+
+
+def normalize_answers(answers):
+    """把提交的答案展开为逐题记录
+
+    answers 为 {问卷下标: {题目: 答案}}（下标可能已被 JSON 转成字符串），
+    返回 (问卷 key, 题号, 题目, 选项, 分值, 文本答案) 元组列表。
+    """
+    items = []
+    for q_idx, questionnaire_answers in (answers or {}).items():
+        try:
+            index = int(q_idx)
+            key = QUESTIONNAIRES[index]["key"]
+        except (ValueError, IndexError):
+            logging.warning(f"未知问卷: {q_idx}")
+            continue
+        lookup = _question_lookup(index)
+        for position, (question, answer) in enumerate(questionnaire_answers.items(), start=1):
+            item_no = lookup.get(question, (position, None))[0]
+            if isinstance(answer, dict):
+                items.append((key, item_no, question, answer.get("option"), answer.get("score"), None))
+            elif isinstance(answer, list):
+                items.append((key, item_no, question, None, None, json.dumps(answer, ensure_ascii=False)))
+            else:
+                items.append((key, item_no, question, None, None, str(answer)))
+    return items
+
+
+def _is_reverse_keyed(question):
+    return question.get("scoring") == "negative" or bool(question.get("reverse"))
+
+
+def _item_scales(key, item_no, question):
+    """题目计入的量表名列表"""
+    if key == "big_five":
+        code = factor_code(question.get("category"))
+        return [f"big_five_{code}"] if code else []
+    if key == "bdi":
+        return ["bdi_total"]
+    if key == "stai":
+        return ["stai_state" if item_no <= STAI_STATE_ITEMS else "stai_trait", "stai_total"]
+    return []
+
+
+class CompiledQuestionnaire:
+    """编译后的问卷：选项分值矩阵 + 题目到量表的映射矩阵
+
+    响应以 (人数, 题数) 的选项下标矩阵表示（MISSING 为未作答），
+    计分即一次查表加一次矩阵乘法，可以一次处理大批量响应。
+    """
+
+    def __init__(self, key, definition, prekeyed=False):
+        self.key = key
+        self.questions = questions = definition.questions if definition else ()
+        self.lookup = {q["question"]: (i + 1, q) for i, q in enumerate(questions)}
+        n_items = len(questions)
+        raw_scores = definition.option_scores if definition else np.zeros((0, 0), dtype=np.float32)
+        # 多出一列 0 分，未作答的题目查表到这一列
+        self.option_scores = np.zeros((n_items, raw_scores.shape[1] + 1), dtype=np.float32)
+        self.option_index = []  # 每题：选项字母 -> 列下标
+        self.reverse = np.zeros(n_items, dtype=bool)
+        scales = {}
+        item_scales = []
+        for i, q in enumerate(questions):
+            options = [o for o in (q.get("options") or ()) if isinstance(o, dict)]
+            scores = raw_scores[i, :len(options)]
+            self.reverse[i] = _is_reverse_keyed(q)
+            if self.reverse[i] and not prekeyed and len(scores):
+                scores = scores.min() + scores.max() - scores
+            self.option_scores[i, :len(scores)] = scores
+            self.option_index.append({o["option"]: j for j, o in enumerate(options)})
+            names = _item_scales(key, i + 1, q) if options else []
+            item_scales.append(names)
+            for name in names:
+                scales.setdefault(name, len(scales))
+        self.scales = list(scales)
+        self.weights = np.zeros((n_items, len(scales)), dtype=np.float32)
+        for i, names in enumerate(item_scales):
+            for name in names:
+                self.weights[i, scales[name]] = 1
+        self._rows = np.arange(n_items)
+
+    def encode(self, answers):
+        """{题目: {"option": ...}} -> 一行选项下标"""
+        row = np.full(len(self.questions), MISSING, dtype=np.int16)
+        for i, q in enumerate(self.questions):
+            answer = answers.get(q["question"])
+            if isinstance(answer, dict):
+                row[i] = self.option_index[i].get(answer.get("option"), MISSING)
+        return row
+
+    def encode_items(self, items):
+        """由逐题记录 (题号, 选项) 生成一行选项下标"""
+        row = np.full(len(self.questions), MISSING, dtype=np.int16)
+        for item_no, option in items:
+            if 1 <= item_no <= len(self.questions):
+                row[item_no - 1] = self.option_index[item_no - 1].get(option, MISSING)
+        return row
+
+    def score_batch(self, responses):
+        """批量计分：responses 为 (人数, 题数) 的选项下标矩阵
+
+        返回 {量表名: (分数数组, 计分题数数组)}
+        """
+        responses = np.asarray(responses)
+        if responses.ndim == 1:
+            responses = responses[None, :]
+        answered = responses >= 0
+        # MISSING (-1) 正好索引到最后一列的 0 分
+        item_scores = self.option_scores[self._rows, responses]
+        totals = item_scores @ self.weights
+        counts = answered.astype(np.float32) @ self.weights
+        return {name: (totals[:, j], counts[:, j].astype(np.int32)) for j, name in enumerate(self.scales)}
+
+
+_compiled = {}  # 问卷下标 -> (题库定义, 编译结果)
+_compiled_lock = threading.Lock()
+
+
+def compile_questionnaire(index):
+    """编译问卷的计分矩阵；题库定义不变时复用上次的结果"""
+    definition = _definition(index)
+    with _compiled_lock:
+        cached = _compiled.get(index)
+        if cached is None or cached[0] is not definition:
+            config = QUESTIONNAIRES[index]
+            cached = _compiled[index] = (definition, CompiledQuestionnaire(config["key"], definition, config["prekeyed"]))
+        return cached[1]
+
+
+def _collect(results, totals):
+    for name, (score, count) in results.items():
+        if count[0]:
+            totals[name] = (float(score[0]), int(count[0]))
+
+
+def score_answers(answers):
+    """对一次提交（{问卷下标: {题目: 答案}}）计分，返回 {量表名: (分数, 计分题数)}"""
+    totals = {}
+    for q_idx, questionnaire_answers in (answers or {}).items():
+        try:
+            compiled = compile_questionnaire(int(q_idx))
+        except (ValueError, IndexError):
+            continue
+        _collect(compiled.score_batch(compiled.encode(questionnaire_answers)), totals)
+    return totals
+
+
+def scale_scores(items):
+    """由 normalize_answers 得到的逐题记录计算量表分：大五人格各因子、BDI 总分、STAI 状态/特质/总分
+
+    返回 {量表名: (分数, 计分题数)}
+    """
+    grouped = {}
+    for key, item_no, question, option, score, text in items:
+        if option is not None:
+            grouped.setdefault(key, []).append((item_no, option))
+    totals = {}
+    for key, questionnaire_items in grouped.items():
+        compiled = compile_questionnaire(_QUESTIONNAIRE_INDEX[key])
+        _collect(compiled.score_batch(compiled.encode_items(questionnaire_items)), totals)
+    return totals
+
+
+def scale_label(scale):
+    """量表名的中文显示名称"""
+    if scale.startswith("big_five_"):
+        code = scale[len("big_five_"):]
+        for q in load_questionnaire(_QUESTIONNAIRE_INDEX["big_five"]):
+            if factor_code(q.get("category")) == code:
+                return q["category"].split("（")[0]
+    return {"bdi_total": "抑郁（BDI）总分", "stai_state": "状态焦虑", "stai_trait": "特质焦虑",
+            "stai_total": "焦虑（STAI）总分"}.get(scale, scale)
+
+
+def format_scale_scores(scores):
+    """把量表分整理为文字，用于界面显示和发送给大模型"""
+    return "\n".join(f"{scale_label(scale)}：{score:g}（{count} 题）" for scale, (score, count) in scores.items())
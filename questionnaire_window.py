@@ -1,8 +1,18 @@
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import requests
+
+from painting_app_report_view import ReportView
+from qianfan_client import get_client
+from questionnaire_registry import get_questionnaire_registry
+from report_cache import answers_key, get_report_cache
+from questionnaire_scoring import score_answers, format_scale_scores
+from report_pipeline import report_pipeline
+
+QUESTIONNAIRE_APP_ID = "af332bbb-5283-4bf2-9170-e506edf50ca5"
+QUESTIONNAIRE_PROMPT = ("这是我的问卷,是用json格式发送的，请帮我分析一下我的心理状态：{answers}，"
+                        "各量表得分如下：\n{scores}\n"
+                        "你在返回的时候不要使用markdown格式，也不要使用代码块，只需要返回纯文本就行了。")
 
 
 class UserDB:
@@ -10,19 +20,112 @@ class UserDB:
         pass
 
 
+def _is_choice(question):
+    """单选题：不是文本题或多选题且带选项（与题库校验的判断一致，不依赖选项容器的类型）"""
+    return question.get("type") not in ("text", "checkbox") and bool(question.get("options"))
+
+
+class _QuestionnairePage:
+    """一个问卷的滚动页面：题目控件随滚动分批创建，作答结果直接写入 answers 字典"""
+
+    BATCH_SIZE = 10  # 每次创建的题目数
+
+    def __init__(self, parent, questions, answers):
+        self.questions = questions
+        self.answers = answers
+        self.built = 0
+        self._scheduled = False
+        self._vars = []  # 已创建行的 Tk 变量，需要保持引用，否则控件的选中状态会丢失
+
+        # 创建垂直滚动条
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # 创建一个画布用于承载题目
+        self.canvas = tk.Canvas(parent)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.configure(yscrollcommand=lambda first, last: self._on_scroll(scrollbar, first, last))
+        scrollbar.config(command=self.canvas.yview)
+
+        # 创建一个内部框架用于实际放置题目，尺寸变化时更新滚动区域
+        self.inner_frame = ttk.Frame(self.canvas)
+        self.canvas.create_window((0, 0), window=self.inner_frame, anchor=tk.NW)
+        self.inner_frame.bind("<Configure>",
+                              lambda event: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.build_more()
+
+    def _on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # 接近已创建内容的底部时再创建下一批题目
+        if float(last) > 0.8 and self.built < len(self.questions) and not self._scheduled:
+            self._scheduled = True
+            self.canvas.after_idle(self.build_more)
+
+    def build_more(self):
+        self._scheduled = False
+        end = min(self.built + self.BATCH_SIZE, len(self.questions))
+        for i in range(self.built, end):
+            self._build_row(i)
+        self.built = end
+
+    def _set(self, key, value):
+        self.answers[key] = value
+
+    def _build_row(self, i):
+        question = self.questions[i]
+        key = f"q{i + 1}"
+        page = ttk.Frame(self.inner_frame)
+        ttk.Label(page, text=f"{i + 1}. {question['question']}").pack(pady=5)
+        if _is_choice(question):
+            # 变量只用于显示选中状态，已创建的行才有；作答结果以 answers 为准
+            var = tk.StringVar(page, value=self.answers.get(key, ""))
+            self._vars.append(var)
+            for opt in question["options"]:
+                if isinstance(opt, dict):
+                    ttk.Radiobutton(page, text=f"{opt['option']}. {opt['description']}", variable=var,
+                                    value=opt['option'],
+                                    command=lambda v=opt['option']: self._set(key, v)).pack(anchor=tk.W)
+                else:
+                    print(f"Unexpected option format: {opt}")
+        elif question.get("type") == "text":
+            text = tk.Text(page, height=8, width=50, highlightbackground="gray", highlightthickness=1)
+            text.insert("1.0", self.answers.get(key, ""))
+            text.edit_modified(False)
+
+            def _on_modified(event, widget=text):
+                if widget.edit_modified():
+                    self._set(key, widget.get("1.0", tk.END).strip())
+                    widget.edit_modified(False)
+
+            text.bind("<<Modified>>", _on_modified)
+            text.pack(padx=10, pady=5)
+        elif question.get("type") == "checkbox":
+            selected = self.answers.setdefault(key, set())
+            for j, opt in enumerate(question["options"]):
+                var = tk.IntVar(page, value=int(j in selected))
+                self._vars.append(var)
+                ttk.Checkbutton(page, text=opt, variable=var,
+                                command=lambda j=j, v=var: selected.add(j) if v.get() else selected.discard(j)
+                                ).pack(anchor=tk.W)
+        page.pack(fill=tk.BOTH, expand=True)
+
+
 class QuestionnaireWindow:
     def __init__(self, master, on_submit, user_id, analysis_id):
         self.final_answers = None
+        self.scale_scores = {}  # 本地计算的量表分 {量表名: (分数, 计分题数)}
         self.master = master
         self.on_submit = on_submit
         self.user_id = user_id  # 新增用户 ID
         self.analysis_id = analysis_id  # 新增 analysis_id
-        self.answers = {}
+        self.answers = {}  # {问卷下标: {"q1": 选项字母 / 文本 / 勾选的选项下标集合}}
         self.current_questionnaire = 0
         self.json_files = ["data/1.json", "data/BDI.json", "data/STAY.json"]
         # self.json_files = ["data/test.json"] #用于测试
         self.questionnaire_names = ["大五人格测试", "贝克抑郁量表", "状态特质焦虑量表"]  # 问卷中文名称
         self.questionnaires = [self.load_questions(file) for file in self.json_files]
+        # 答题期间补足问卷报告的预建对话（登录时已开始预建）
+        report_pipeline.warm_conversations(QUESTIONNAIRE_APP_ID)
         self.db = UserDB()  # 初始化数据库对象
         self.menu_items = []  # 用于存储菜单项
         self.questionnaire_menu = None  # 保存问卷菜单的引用
@@ -33,16 +136,13 @@ class QuestionnaireWindow:
 
         self._create_menu()
         self._create_widgets()
-        self.update_menu()  # 初始化菜单显示
 
     def load_questions(self, json_file_path):
+        # 题库由注册表统一加载和校验，所有窗口共享同一份只读数据
         try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print("错误: 文件未找到!")
-        except json.JSONDecodeError:
-            print("错误: 无法解析 JSON 文件!")
+            return get_questionnaire_registry().questions(json_file_path)
+        except KeyError:
+            print(f"错误: 题库 {json_file_path} 不存在或格式无效!")
         return []
 
     def _create_menu(self):
@@ -75,74 +175,35 @@ class QuestionnaireWindow:
             self.questionnaire_menu.entryconfig(i, label=display_name)
 
     def show_questionnaire(self, idx):
+        # 页面只在第一次显示时创建，之后切换问卷只是切换标签页
+        self.notebook.select(idx)
+
+    def _on_tab_changed(self, event=None):
+        idx = self.notebook.index("current")
+        if self.pages[idx] is None:
+            self.pages[idx] = _QuestionnairePage(
+                self.tab_frames[idx], self.questionnaires[idx], self.answers.setdefault(idx, {}))
         self.current_questionnaire = idx
-        self._create_widgets()
         self.update_menu()  # 更新菜单显示
 
     def _create_widgets(self):
-        if hasattr(self, 'notebook'):
-            self.notebook.destroy()
-        if hasattr(self, 'btn_frame'):
-            self.btn_frame.destroy()
-
         self.notebook = ttk.Notebook(self.window)
-        questions = self.questionnaires[self.current_questionnaire]
-
-        # 创建一个框架用于容纳题目和滚动条
-        scrollable_frame = ttk.Frame(self.notebook)
-        scrollable_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        # 创建垂直滚动条
-        scrollbar = ttk.Scrollbar(scrollable_frame, orient=tk.VERTICAL)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.pages = [None] * len(self.questionnaires)  # 每个问卷的页面，首次显示时创建
+        self.tab_frames = []
+        for name in self.questionnaire_names:
+            frame = ttk.Frame(self.notebook)
+            self.notebook.add(frame, text=name)
+            self.tab_frames.append(frame)
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self.notebook.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 
-        # 创建一个画布用于承载题目
-        canvas = tk.Canvas(scrollable_frame, yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        scrollbar.config(command=canvas.yview)
-
-        # 创建一个内部框架用于实际放置题目
-        inner_frame = ttk.Frame(canvas)
-        canvas.create_window((0, 0), window=inner_frame, anchor=tk.NW)
-
-        for i, question in enumerate(questions):
-            page = ttk.Frame(inner_frame)
-            ttk.Label(page, text=f"{i + 1}. {question['question']}").pack(pady=5)
-            if isinstance(question.get("options"), list):
-                self.answers.setdefault(self.current_questionnaire, {})[f"q{i + 1}"] = tk.StringVar()
-                for opt in question["options"]:
-                    if isinstance(opt, dict):
-                        ttk.Radiobutton(page, text=f"{opt['option']}. {opt['description']}",
-                                        variable=self.answers[self.current_questionnaire][f"q{i + 1}"],
-                                        value=opt['option']).pack(anchor=tk.W)
-                    else:
-                        print(f"Unexpected option format: {opt}")
-            elif question.get("type") == "text":
-                self.answers.setdefault(self.current_questionnaire, {})[f"q{i + 1}"] = tk.Text(page, height=8, width=50,
-                                                                                               highlightbackground="gray",
-                                                                                               highlightthickness=1)
-                self.answers[self.current_questionnaire][f"q{i + 1}"].pack(padx=10, pady=5)
-            elif question.get("type") == "checkbox":
-                self.answers.setdefault(self.current_questionnaire, {})[f"q{i + 1}"] = []
-                for opt in question["options"]:
-                    var = tk.IntVar()
-                    ttk.Checkbutton(page, text=opt, variable=var).pack(anchor=tk.W)
-                    self.answers[self.current_questionnaire][f"q{i + 1}"].append(var)
-            page.pack(fill=tk.BOTH, expand=True)
-
-        # 更新画布的滚动区域
-        inner_frame.update_idletasks()
-        canvas.config(scrollregion=canvas.bbox("all"))
-
-        # 绑定鼠标滚轮事件
+        # 鼠标滚轮只绑定一次，滚动当前显示的问卷
         def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+            page = self.pages[self.current_questionnaire]
+            if page is not None:
+                page.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
 
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
-
-        self.notebook.add(scrollable_frame, text=self.questionnaire_names[self.current_questionnaire])
-        self.notebook.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        self.window.bind_all("<MouseWheel>", _on_mousewheel)
 
         # 控制按钮
         self.btn_frame = ttk.Frame(self.window)
@@ -153,78 +214,54 @@ class QuestionnaireWindow:
         ttk.Button(self.btn_frame, text="跳到下一个问卷", command=self.next_questionnaire).pack(side=tk.LEFT, padx=5)
         ttk.Button(self.btn_frame, text="提交", command=self.submit).pack(side=tk.RIGHT, padx=5)
         self.btn_frame.pack(pady=10)
+        self.show_questionnaire(self.current_questionnaire)
+        self._on_tab_changed()
 
     def prev_page(self):
         if self.notebook.index("current") > 0:
             self.notebook.select(self.notebook.index("current") - 1)
 
     def next_page(self):
-        if self.notebook.index("current") < len(self.questionnaires[self.current_questionnaire]) - 1:
+        if self.notebook.index("current") < len(self.questionnaires) - 1:
             self.notebook.select(self.notebook.index("current") + 1)
 
     def next_questionnaire(self):
         if self.current_questionnaire < len(self.questionnaires) - 1:
-            self.current_questionnaire += 1
-            self._create_widgets()
-            self.update_menu()  # 更新菜单显示
+            self.show_questionnaire(self.current_questionnaire + 1)
 
     def behind_questionnaire(self):
         if self.current_questionnaire > 0:
-            self.current_questionnaire -= 1
-            self._create_widgets()
-            self.update_menu()  # 更新菜单显示
+            self.show_questionnaire(self.current_questionnaire - 1)
 
     def submit(self):
-        # 收集答案和未回答的题目
+        # 收集答案和未回答的题目（答案都在 self.answers 的普通数据里，不需要读取控件）
         final_answers = {}
         unanswered_questions = []  # 记录未回答的题目
         
         for q_idx, questions in enumerate(self.questionnaires):
             final_answers[q_idx] = {}
             questionnaire_name = self.questionnaire_names[q_idx]
-            
-            # 确保答案字典已初始化
-            if q_idx not in self.answers:
-                self.answers[q_idx] = {}
+            answers = self.answers.get(q_idx, {})
             
             for i in range(len(questions)):
                 question = questions[i]["question"]
-                question_key = f"q{i + 1}"
+                value = answers.get(f"q{i + 1}")
                 
-                if isinstance(questions[i].get("options"), list):
-                    if question_key not in self.answers[q_idx] or not self.answers[q_idx][question_key].get():
-                        unanswered_questions.append(f"{questionnaire_name} - 问题 {i + 1}: {question}")
-                    else:
-                        selected_option = self.answers[q_idx][question_key].get()
-                        for opt in questions[i]["options"]:
-                            if opt["option"] == selected_option:
-                                final_answers[q_idx][question] = {
-                                    "option": selected_option,
-                                    "description": opt["description"],
-                                    "score": opt["score"]
-                                }
-                                break
+                if not value:
+                    unanswered_questions.append(f"{questionnaire_name} - 问题 {i + 1}: {question}")
+                elif _is_choice(questions[i]):
+                    for opt in questions[i]["options"]:
+                        if opt["option"] == value:
+                            final_answers[q_idx][question] = {
+                                "option": value,
+                                "description": opt["description"],
+                                "score": opt["score"]
+                            }
+                            break
                 elif questions[i].get("type") == "text":
-                    if question_key not in self.answers[q_idx]:
-                        unanswered_questions.append(f"{questionnaire_name} - 问题 {i + 1}: {question}")
-                    else:
-                        answer = self.answers[q_idx][question_key].get("1.0", tk.END).strip()
-                        if not answer:
-                            unanswered_questions.append(f"{questionnaire_name} - 问题 {i + 1}: {question}")
-                        else:
-                            final_answers[q_idx][question] = answer
+                    final_answers[q_idx][question] = value
                 elif questions[i].get("type") == "checkbox":
-                    if question_key not in self.answers[q_idx]:
-                        unanswered_questions.append(f"{questionnaire_name} - 问题 {i + 1}: {question}")
-                    else:
-                        selected_options = []
-                        for j, var in enumerate(self.answers[q_idx][question_key]):
-                            if var.get() == 1:
-                                selected_options.append(questions[i]["options"][j])
-                        if not selected_options:
-                            unanswered_questions.append(f"{questionnaire_name} - 问题 {i + 1}: {question}")
-                        else:
-                            final_answers[q_idx][question] = selected_options
+                    final_answers[q_idx][question] = [questions[i]["options"][j] for j in sorted(value)]
         
         # 如果有未回答的题目，询问用户是否要继续提交
         if unanswered_questions:
@@ -239,84 +276,51 @@ class QuestionnaireWindow:
                 return
         
         # print("提交的答案：", final_answers)
+        # 本地计分，不需要等待网络
+        self.scale_scores = score_answers(final_answers)
         self.handle_submit(final_answers)
         self.final_answers = final_answers
-        self.on_submit(final_answers)
+        self.on_submit(final_answers, self.scale_scores)
         self.window.destroy()
 
     def handle_submit(self, final_answers):
-        def show_loading():
-            loading_window = tk.Toplevel(self.master)
-            loading_window.title("正在生成报告...")
-            loading_window.geometry("400x300")
-            loading_window.resizable(False, False)
-
-            style = ttk.Style()
-            style.theme_use('default')
-            style.configure("TProgressbar", thickness=30)
-            progress = ttk.Progressbar(loading_window, style="TProgressbar", mode='indeterminate')
-            progress.pack(pady=20)
-            progress.start()
-
-            return loading_window
-
-        def hide_loading(loading_window):
-            loading_window.destroy()
+        # 报告窗口属于主窗口，问卷窗口关闭后仍然逐段显示
+        view = ReportView(self.master, "问卷分析报告")
 
         def generate_report_async():
-            loading_window = show_loading()
             try:
-                report = self.generate_report(final_answers)
+                report = self.generate_report(final_answers, on_chunk=view.append)
                 if report:
-                    # report 现在直接是字符串内容，不需要再解析
-                    messagebox.showinfo("生成的报告", report)
+                    view.finish(report)
                     print(report)
                     self.db.add_second_final_report(self.user_id, report)  # 保存报告到数据库
                 else:
-                    messagebox.showerror("错误", "无法生成报告")
-                hide_loading(loading_window)
-                self.window.destroy()
+                    view.fail("无法生成报告")
             except Exception as e:
-                hide_loading(loading_window)
-                messagebox.showerror("错误", str(e))
-                self.window.destroy()
+                view.fail(str(e))
 
         threading.Thread(target=generate_report_async, daemon=True).start()
 
-    def generate_report(self, final_answers):
+    def generate_report(self, final_answers, on_chunk=None, use_cache=True):
         print("提交的答案：", final_answers)
-        app_id = "af332bbb-5283-4bf2-9170-e506edf50ca5"
-        with open('token.txt', 'r') as file:
-            token = file.read().strip() 
-        url = "https://qianfan.baidubce.com/v2/app/conversation"
-        
-        payload = json.dumps({
-            "app_id": app_id,
-        }, ensure_ascii=False)
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.request("POST", url, headers=headers, data=payload.encode("utf-8"))
-        
-        conversation_id = response.json().get("conversation_id")
+        # 相同答案的报告直接从缓存返回，不再调用接口
+        cache = get_report_cache()
+        key = answers_key(final_answers, QUESTIONNAIRE_APP_ID, QUESTIONNAIRE_PROMPT)
+        if use_cache:
+            cached = cache.get(key)
+            if cached:
+                if on_chunk:
+                    on_chunk(cached)
+                return cached
+
+        client = get_client()
+        conversation_id = report_pipeline.take_conversation(QUESTIONNAIRE_APP_ID)
         print("Conversation ID:", conversation_id)
 
         # ------------------发送消息------------------
-        url = "https://qianfan.baidubce.com/v2/app/conversation/runs"
-        
-        payload = {
-            "app_id": app_id,
-            "query": f"这是我的问卷,是用json格式发送的，请帮我分析一下我的心理状态：{str(final_answers)}，你在返回的时候不要使用markdown格式，也不要使用代码块，只需要返回纯文本就行了。",
-            "conversation_id": conversation_id,
-            "stream": False,
-        }
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.request("POST", url, headers=headers, data=json.dumps(payload).encode("utf-8"))
-
-        return response.json().get("answer")
\ No newline at end of file
+        query = QUESTIONNAIRE_PROMPT.format(answers=str(final_answers),
+                                            scores=format_scale_scores(self.scale_scores))
+        answer, stats = client.run_stream(QUESTIONNAIRE_APP_ID, conversation_id, query, on_chunk=on_chunk)
+        print(f"问卷报告生成完成: 首字 {stats['ttft'] or 0:.2f} s，总耗时 {stats['duration']:.2f} s")
+        cache.put(key, answer, "answers", QUESTIONNAIRE_APP_ID)
+        return answer
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# 缓存的报告保留时间（秒）和最多保留的条数
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+
+def _base_path():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def canonical_answers(final_answers):
+    """问卷答案的规范化 JSON：键统一为字符串并排序，与提交时的字典顺序无关"""
+    return json.dumps(final_answers, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def drawing_key(image_hash, app_id, prompt):
+    """绘画报告的缓存键：图片内容哈希 + app_id + 提示词"""
+    return _digest("drawing", image_hash, app_id, prompt)
+
+
+def answers_key(final_answers, app_id, prompt_template):
+    """问卷报告的缓存键：规范化答案的哈希 + app_id + 提示词模板"""
+    return _digest("answers", hashlib.sha256(canonical_answers(final_answers).encode('utf-8')).hexdigest(),
+                   app_id, prompt_template)
+
+
+class ReportCache:
+    """SQLite 中的大模型报告缓存，按过期时间和条数（最近最少使用）淘汰
+
+    enabled 为 False（或环境变量 REPORT_CACHE_DISABLED=1）时跳过缓存，每次都重新生成。
+    """
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled and os.environ.get("REPORT_CACHE_DISABLED") != "1"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        with self._conn:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS report_cache (
+                        key TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        app_id TEXT NOT NULL,
+                        image_hash TEXT,
+                        report TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0)''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_report_cache_last_used ON report_cache(last_used)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_report_cache_image ON report_cache(image_hash, app_id)")
+
+    def get(self, key):
+        """命中时返回报告文本，未命中、已过期或缓存关闭时返回 None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT report, created_at FROM report_cache WHERE key=?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn.execute("UPDATE report_cache SET last_used=?, hits=hits+1 WHERE key=?", (now, key))
+                self.hits += 1
+                result = row[0]
+            else:
+                if row:
+                    self._conn.execute("DELETE FROM report_cache WHERE key=?", (key,))
+                self.misses += 1
+                result = None
+        logging.info(f"报告缓存{'命中' if result is not None else '未命中'}: {key[:12]}（命中率 {self.hit_rate():.0%}）")
+        return result
+
+    def has_image(self, image_hash, app_id):
+        """这张图片是否已有未过期的绘画报告（用于跳过预上传）"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            row = self._conn.execute('''SELECT 1 FROM report_cache
+                                        WHERE image_hash=? AND app_id=? AND created_at>=?''',
+                                     (image_hash, app_id, time.time() - self.ttl)).fetchone()
+        return row is not None
+
+    def put(self, key, report, kind, app_id, image_hash=None):
+        if not self.enabled or not report:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('''INSERT OR REPLACE INTO report_cache
+                                  (key, kind, app_id, image_hash, report, created_at, last_used)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                               (key, kind, app_id, image_hash, report, now, now))
+            self._evict(now)
+
+    def _evict(self, now):
+        """删除过期条目，再按最近使用时间裁剪到 max_entries 条"""
+        self._conn.execute("DELETE FROM report_cache WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute('''DELETE FROM report_cache WHERE key IN (
+                                  SELECT key FROM report_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)''',
+                           (self.max_entries,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM report_cache")
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(report)), 0) FROM report_cache").fetchone()
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """进程内共享的报告缓存（data/report_cache.db）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReportCache(os.path.join(_base_path(), 'data', 'report_cache.db'))
+        return _cache
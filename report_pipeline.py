@@ -0,0 +1,186 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from psychology_report import (app_id as DRAWING_APP_ID, drawing_digest, prepare_drawing_upload,
+                               generate_psychology_report, has_cached_report)
+from qianfan_client import get_client
+
+# 每个 app_id 预先建好的对话数，以及预建对话的有效期（秒），过期的不再使用
+CONVERSATION_POOL_SIZE = 2
+CONVERSATION_TTL = 30 * 60
+
+
+def _file_key(path):
+    """图片路径 + 修改时间 + 大小，文件再次保存后之前的预上传作废"""
+    try:
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+class _DaemonExecutor:
+    """守护线程池（submit 与 ThreadPoolExecutor 相同）：关闭程序时不等待进行中的大模型请求"""
+
+    def __init__(self, workers, name):
+        self._tasks = queue.SimpleQueue()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"{name}_{i}", daemon=True).start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._tasks.put((future, fn, args, kwargs))
+        return future
+
+    def _worker(self):
+        while True:
+            future, fn, args, kwargs = self._tasks.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class ReportJob:
+    """在后台运行的报告：界面打开之前收到的片段先缓存，attach 时回放再继续实时转发"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._listeners = []
+        self.future = None
+
+    def on_chunk(self, text):
+        with self._lock:
+            self._chunks.append(text)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(text)
+
+    def attach(self, on_chunk, on_done, on_error):
+        """接收已有和后续的片段；报告结束时调用 on_done(报告) 或 on_error(异常)"""
+        with self._lock:
+            for text in self._chunks:
+                on_chunk(text)
+            self._listeners.append(on_chunk)
+
+        def _done(future):
+            error = future.exception()
+            if error is not None:
+                on_error(error)
+            else:
+                on_done(future.result())
+
+        self.future.add_done_callback(_done)
+
+
+class ReportPipeline:
+    """报告流水线：绘画一保存就在后台新建对话并上传，问卷提交后绘画报告与问卷报告同时生成"""
+
+    def __init__(self, workers=4):
+        self.executor = _DaemonExecutor(workers, "report")
+        self._lock = threading.Lock()
+        self._drawing_key = None
+        self._drawing_upload = None
+        self._conversations = {}  # app_id -> deque[(对话 Future, 创建时间)]
+
+    def prefetch_drawing(self, image_path):
+        """提前为这张绘画新建对话并上传（同一文件内容只做一次）"""
+        key = _file_key(image_path)
+        if key is None:
+            return
+        with self._lock:
+            if key == self._drawing_key:
+                return
+            self._drawing_key = key
+            self._drawing_upload = self.executor.submit(self._prefetch_drawing, image_path)
+
+    def _prefetch_drawing(self, image_path):
+        """返回 (图片哈希, 预上传结果)；哈希留给生成报告时使用，每份报告只读取一次整个文件"""
+        path, image_hash = drawing_digest(image_path)
+        if path is None:
+            return None, None
+        if has_cached_report(path, image_hash):
+            logging.info(f"绘画报告已有缓存，跳过预上传: {path}")
+            return image_hash, None
+        logging.info(f"后台预上传绘画: {path}")
+        return image_hash, prepare_drawing_upload(path, self.take_conversation(DRAWING_APP_ID))
+
+    def _take_drawing_upload(self, image_path):
+        """取出与当前文件内容一致的 (图片哈希, 预上传结果)，没有时为 (None, None)（每个对话只用一次）"""
+        with self._lock:
+            future = self._drawing_upload
+            if future is None or _file_key(image_path) != self._drawing_key:
+                return None, None
+            self._drawing_key = self._drawing_upload = None
+        try:
+            image_hash, prepared = future.result()
+            return image_hash, (prepared if prepared and prepared[1] else None)
+        except Exception as e:
+            logging.error(f"预上传失败，重新上传: {str(e)}")
+            return None, None
+
+    def start_drawing_report(self, image_path, features):
+        """在后台开始生成绘画报告，返回 ReportJob"""
+        job = ReportJob()
+
+        def run():
+            image_hash, prepared = self._take_drawing_upload(image_path) if image_path else (None, None)
+            path = image_path
+            if image_hash is None:
+                path, image_hash = drawing_digest(image_path)
+            conversation_id = None
+            if prepared is None and image_hash and not has_cached_report(path, image_hash):
+                conversation_id = self.take_conversation(DRAWING_APP_ID)
+            return generate_psychology_report(features, on_chunk=job.on_chunk, prepared=prepared, image_path=path,
+                                              conversation_id=conversation_id, image_hash=image_hash)
+
+        job.future = self.executor.submit(run)
+        return job
+
+    def warm_conversations(self, *app_ids, size=CONVERSATION_POOL_SIZE):
+        """在后台为每个 app_id 预建对话，补足到 size 个（登录后调用）"""
+        with self._lock:
+            for app_id in app_ids:
+                pool = self._conversations.setdefault(app_id, deque())
+                self._expire(pool)
+                for _ in range(size - len(pool)):
+                    pool.append((self.executor.submit(get_client().create_conversation, app_id), time.monotonic()))
+
+    @staticmethod
+    def _expire(pool):
+        """丢掉超过 CONVERSATION_TTL 的预建对话"""
+        now = time.monotonic()
+        while pool and now - pool[0][1] > CONVERSATION_TTL:
+            pool.popleft()
+
+    def take_conversation(self, app_id):
+        """从预建池中取出一个对话并在后台补充；池空或创建失败时现场新建"""
+        while True:
+            with self._lock:
+                pool = self._conversations.get(app_id)
+                if pool is not None:
+                    self._expire(pool)
+                entry = pool.popleft() if pool else None
+            if entry is None:
+                break
+            try:
+                conversation_id = entry[0].result()
+                if conversation_id:
+                    self.warm_conversations(app_id)
+                    return conversation_id
+            except Exception as e:
+                logging.error(f"预建对话失败，重新创建: {str(e)}")
+        self.warm_conversations(app_id)
+        return get_client().create_conversation(app_id)
+
+
+# 全局共享的报告流水线
+report_pipeline = ReportPipeline()
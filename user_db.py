@@ -2,12 +2,161 @@ import sqlite3
 import hashlib
 import os
 import sys
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import json
 
+from questionnaire_scoring import normalize_answers, scale_scores
+
+
+def _migration_create_tables(conn):
+    """v1：基础表结构（旧数据库上执行也不会重复建表）"""
+    # 创建用户表
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
+
+    # 创建分析记录表
+    conn.execute('''CREATE TABLE IF NOT EXISTS analysis_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                analysis_time TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                analysis_result TEXT NOT NULL,
+                additional_info TEXT,
+                final_report TEXT,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE)''')
+
+    # 创建问卷记录表
+    conn.execute('''CREATE TABLE IF NOT EXISTS questionnaire_answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                analysis_id INTEGER NOT NULL,
+                answers TEXT NOT NULL,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY(analysis_id) REFERENCES analysis_history(id) ON DELETE CASCADE)''')
+
+    # 创建新表用于存储另一份分析报告
+    conn.execute('''CREATE TABLE IF NOT EXISTS second_analysis_reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                report_time TEXT NOT NULL,
+                second_report TEXT NOT NULL,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE)''')
+
+
+def _migration_legacy_columns(conn):
+    """v2：把 users 表中旧版的分析字段迁移到 analysis_history"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if 'last_analysis_time' not in columns:
+        return
+    conn.execute('''INSERT INTO analysis_history (user_id, analysis_time, file_path, analysis_result)
+                  SELECT id, last_analysis_time, 'legacy_data', last_analysis_result
+                  FROM users
+                  WHERE last_analysis_time IS NOT NULL''')
+    try:
+        conn.execute("ALTER TABLE users DROP COLUMN last_analysis_time")
+        conn.execute("ALTER TABLE users DROP COLUMN last_analysis_result")
+    except sqlite3.OperationalError:
+        pass  # SQLite 3.35 以下不支持 DROP COLUMN，旧字段保留但不再使用
+
+
+def _migration_indexes(conn):
+    """v3：为历史查询和关联查询建立索引"""
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_analysis_history_user_time
+                    ON analysis_history(user_id, analysis_time DESC)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_questionnaire_answers_analysis
+                    ON questionnaire_answers(analysis_id)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_questionnaire_answers_user
+                    ON questionnaire_answers(user_id)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_second_reports_user_time
+                    ON second_analysis_reports(user_id, report_time DESC)''')
+
+
+def _migration_history_keyset_index(conn):
+    """v4：历史记录按 (analysis_time, id) 游标分页，索引包含 id 避免额外排序"""
+    conn.execute("DROP INDEX IF EXISTS idx_analysis_history_user_time")
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_analysis_history_keyset
+                    ON analysis_history(user_id, analysis_time DESC, id DESC)''')
+
+
+def _write_normalized_answers(conn, user_id, analysis_id, answers, scored_at, scores=None):
+    """写入逐题答案和量表分（与原始 JSON 答案在同一事务中）；scores 为已算好的量表分，没有时由逐题答案计算"""
+    items = normalize_answers(answers)
+    if scores is None:
+        scores = scale_scores(items)
+    conn.executemany('''INSERT OR REPLACE INTO questionnaire_items
+                        (analysis_id, user_id, questionnaire, item_no, question, option, score, answer_text)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     [(analysis_id, user_id) + item for item in items])
+    conn.executemany('''INSERT OR REPLACE INTO scale_scores
+                        (analysis_id, user_id, scale, score, item_count, scored_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     [(analysis_id, user_id, scale, score, count, scored_at)
+                      for scale, (score, count) in scores.items()])
+
+
+def _migration_normalized_answers(conn):
+    """v5：逐题答案表和量表分表，并从已有的 JSON 答案回填"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS questionnaire_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                questionnaire TEXT NOT NULL,
+                item_no INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                option TEXT,
+                score INTEGER,
+                answer_text TEXT,
+                UNIQUE(analysis_id, questionnaire, item_no),
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY(analysis_id) REFERENCES analysis_history(id) ON DELETE CASCADE)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS scale_scores (
+                analysis_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                scale TEXT NOT NULL,
+                score REAL NOT NULL,
+                item_count INTEGER NOT NULL,
+                scored_at TEXT NOT NULL,
+                PRIMARY KEY(analysis_id, scale),
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY(analysis_id) REFERENCES analysis_history(id) ON DELETE CASCADE)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_questionnaire_items_user
+                    ON questionnaire_items(user_id, questionnaire, item_no)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_scale_scores_user_scale
+                    ON scale_scores(user_id, scale, scored_at)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_scale_scores_scale
+                    ON scale_scores(scale, score)''')
+
+    rows = conn.execute('''SELECT q.user_id, q.analysis_id, q.answers, h.analysis_time
+                           FROM questionnaire_answers q
+                           JOIN analysis_history h ON h.id = q.analysis_id''').fetchall()
+    for user_id, analysis_id, answers, analysis_time in rows:
+        try:
+            _write_normalized_answers(conn, user_id, analysis_id, json.loads(answers), analysis_time)
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"[ERROR] 无法回填问卷答案 analysis_id={analysis_id}: {str(e)}")
+
+
+# 按顺序执行的数据库迁移，第 i 项执行完后 PRAGMA user_version = i + 1
+# 新增迁移只能追加到末尾，不能修改已发布的迁移
+MIGRATIONS = [
+    _migration_create_tables,
+    _migration_legacy_columns,
+    _migration_indexes,
+    _migration_history_keyset_index,
+    _migration_normalized_answers,
+]
+
+# 历史列表中每条记录显示的摘要长度（完整内容按需读取）
+HISTORY_SUMMARY_CHARS = 60
+
 
 class UserDB:
-    def __init__(self):
+    def __init__(self, db_path=None):
         if getattr(sys, 'frozen', False):
             # 如果是打包后的 exe 文件
             base_path = os.path.dirname(sys.executable)
@@ -15,77 +164,88 @@ class UserDB:
             # 如果是开发环境下的 Python 脚本
             base_path = os.path.dirname(os.path.abspath(__file__))
 
-        self.db_path = os.path.join(base_path, 'data', 'paint_analysis.db')
+        self.db_path = db_path or os.path.join(base_path, 'data', 'paint_analysis.db')
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._local = threading.local()
+        self._connections = []  # 所有线程打开的连接，关闭时统一释放
+        self._connections_lock = threading.Lock()
         self._init_db()
 
-    def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+    def _get_conn(self):
+        """获取当前线程的长连接（首次使用时创建并设置 PRAGMA）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 每个线程只使用自己的连接；关闭时可能在主线程统一关闭，所以不检查线程
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
             conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL")  # 读写互不阻塞
+            conn.execute("PRAGMA synchronous = NORMAL")  # WAL 模式下足够安全，减少 fsync
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """关闭所有线程的数据库连接（程序退出时调用）"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"[ERROR] 关闭数据库连接失败: {str(e)}")
+        self._local = threading.local()
 
-            # 创建用户表
-            conn.execute('''CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
-
-            # 创建分析记录表
-            conn.execute('''CREATE TABLE IF NOT EXISTS analysis_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        analysis_time TEXT NOT NULL,
-                        file_path TEXT NOT NULL,
-                        analysis_result TEXT NOT NULL,
-                        additional_info TEXT,
-                        final_report TEXT,
-                        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE)''')
-
-            # 创建问卷记录表
-            conn.execute('''CREATE TABLE IF NOT EXISTS questionnaire_answers (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        analysis_id INTEGER NOT NULL,
-                        answers TEXT NOT NULL,
-                        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
-                        FOREIGN KEY(analysis_id) REFERENCES analysis_history(id) ON DELETE CASCADE)''')
-
-            # 创建新表用于存储另一份分析报告
-            conn.execute('''CREATE TABLE IF NOT EXISTS second_analysis_reports (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        report_time TEXT NOT NULL,
-                        second_report TEXT NOT NULL,
-                        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE)''')
-
-            # 迁移旧数据（如果存在旧表结构）
+    def _init_db(self):
+        """按 PRAGMA user_version 执行尚未执行过的迁移，每个迁移只执行一次"""
+        conn = self._get_conn()
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, migration in enumerate(MIGRATIONS[current:], start=current + 1):
             try:
-                conn.execute('''INSERT INTO analysis_history (user_id, analysis_time, file_path, analysis_result)
-                              SELECT id, last_analysis_time, 'legacy_data', last_analysis_result
-                              FROM users
-                              WHERE last_analysis_time IS NOT NULL''')
-                conn.execute("ALTER TABLE users DROP COLUMN last_analysis_time")
-                conn.execute("ALTER TABLE users DROP COLUMN last_analysis_result")
-            except sqlite3.OperationalError:
-                pass
+                conn.execute("BEGIN")
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"[INFO] 数据库已迁移到版本 {version}: {migration.__doc__}")
 
+    @contextmanager
+    def transaction(self):
+        """工作单元：块内的所有写入在同一个事务中提交，出错时整体回滚
+
+        可以嵌套使用，内层的写入方法不会单独提交，由最外层统一提交（只产生一次 fsync）。
+        """
+        conn = self._get_conn()
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            conn.execute("BEGIN")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.rollback()
+            raise
+        self._local.depth = depth
+        if depth == 0:
             conn.commit()
 
     def create_user(self, username, password):
         try:
             hashed_password = self._hash_password(password)
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("PRAGMA foreign_keys = ON")
+            with self.transaction() as conn:
                 conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
                              (username, hashed_password))
-                conn.commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
     def verify_user(self, username, password):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        conn = self._get_conn()
+        with conn:
             cursor = conn.cursor()
             try:
                 # 修复6：使用参数化查询防止SQL注入
@@ -107,54 +267,71 @@ class UserDB:
                 print(f"[ERROR] 数据库查询错误: {str(e)}")
             return None
 
-    def add_analysis_record(self, user_id, file_path, result, additional_info=None):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO analysis_history 
+    def add_analysis_record(self, user_id, file_path, result, additional_info=None, analysis_time=None):
+        with self.transaction() as conn:
+            cursor = conn.execute('''INSERT INTO analysis_history 
                           (user_id, analysis_time, file_path, analysis_result, additional_info)
                           VALUES (?, ?, ?, ?, ?)''',
-                           (user_id, datetime.now().isoformat(), file_path, result,
-                            json.dumps(additional_info) if additional_info else None))
-            analysis_id = cursor.lastrowid
-            conn.commit()
-            return analysis_id
+                                  (user_id, analysis_time or datetime.now().isoformat(), file_path, result,
+                                   json.dumps(additional_info) if additional_info else None))
+            return cursor.lastrowid
 
-    def add_questionnaire_answers(self, user_id, analysis_id, answers):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+    def add_questionnaire_answers(self, user_id, analysis_id, answers, scores=None, analysis_time=None):
+        """保存问卷答案，同时写入逐题答案和量表分（scores 为提交时已算好的量表分）
+
+        量表分的 scored_at 使用 analysis_time（导入历史记录时与分析记录的时间一致），没有时为当前时间。
+        """
+        with self.transaction() as conn:
             conn.execute('''INSERT INTO questionnaire_answers 
                           (user_id, analysis_id, answers)
                           VALUES (?, ?, ?)''',
                          (user_id, analysis_id, json.dumps(answers)))
-            conn.commit()
+            _write_normalized_answers(conn, user_id, analysis_id, answers,
+                                      analysis_time or datetime.now().isoformat(), scores)
 
     def add_final_report(self, analysis_id, final_report):
         if isinstance(final_report, dict):
             final_report = json.dumps(final_report)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        with self.transaction() as conn:
             conn.execute('''UPDATE analysis_history 
                           SET final_report = ?
                           WHERE id = ?''',
                          (final_report, analysis_id))
-            conn.commit()
 
-    def add_second_final_report(self, user_id, second_final_report):
+    def add_second_final_report(self, user_id, second_final_report, report_time=None):
         """新增函数，用于将第二份分析报告写入新表"""
         if isinstance(second_final_report, dict):
             second_final_report = json.dumps(second_final_report)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        with self.transaction() as conn:
             conn.execute('''INSERT INTO second_analysis_reports 
                           (user_id, report_time, second_report)
                           VALUES (?, ?, ?)''',
-                         (user_id, datetime.now().isoformat(), second_final_report))
-            conn.commit()
+                         (user_id, report_time or datetime.now().isoformat(), second_final_report))
+
+    def submit_analysis(self, user_id, file_path, result, additional_info=None, answers=None,
+                        final_report=None, second_report=None, analysis_time=None, scores=None):
+        """在一个事务中写入一次分析提交：分析记录、问卷答案和（已有的）报告，返回 analysis_id"""
+        with self.transaction():
+            analysis_id = self.add_analysis_record(user_id, file_path, result, additional_info, analysis_time)
+            if answers is not None:
+                self.add_questionnaire_answers(user_id, analysis_id, answers, scores, analysis_time)
+            if final_report is not None:
+                self.add_final_report(analysis_id, final_report)
+            if second_report is not None:
+                self.add_second_final_report(user_id, second_report, analysis_time)
+        return analysis_id
+
+    def bulk_import(self, records):
+        """批量导入分析记录（整批一个事务），records 中每项是 submit_analysis 参数组成的字典
+
+        返回按顺序对应的 analysis_id 列表；任意一条失败时整批回滚。
+        """
+        with self.transaction():
+            return [self.submit_analysis(**record) for record in records]
 
     def get_user_history(self, user_id, limit=50):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        conn = self._get_conn()
+        with conn:
             cursor = conn.cursor()
             cursor.execute('''SELECT analysis_time, file_path, analysis_result, final_report 
                             FROM analysis_history 
@@ -163,10 +340,77 @@ class UserDB:
                             LIMIT ?''', (user_id, limit))
             return cursor.fetchall()
 
+    def get_user_history_page(self, user_id, cursor=None, limit=20):
+        """按 (analysis_time, id) 游标分页获取历史摘要，返回 (记录列表, 下一页游标)
+
+        每条记录为 (id, analysis_time, file_path, 结果摘要, 是否有最终报告)；没有更多记录时游标为 None。
+        """
+        params = [HISTORY_SUMMARY_CHARS, user_id]
+        where = "user_id=?"
+        if cursor is not None:
+            where += " AND (analysis_time, id) < (?, ?)"
+            params.extend(cursor)
+        params.append(limit + 1)
+        conn = self._get_conn()
+        with conn:
+            rows = conn.execute(f'''SELECT id, analysis_time, file_path, substr(analysis_result, 1, ?),
+                                       final_report IS NOT NULL
+                                FROM analysis_history
+                                WHERE {where}
+                                ORDER BY analysis_time DESC, id DESC
+                                LIMIT ?''', params).fetchall()
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1][1], rows[-1][0])
+
+    def get_history_summary(self, user_id, analysis_id):
+        """获取单条记录的摘要（格式与 get_user_history_page 相同），用于新增或更新列表中的一行"""
+        conn = self._get_conn()
+        with conn:
+            return conn.execute('''SELECT id, analysis_time, file_path, substr(analysis_result, 1, ?),
+                                       final_report IS NOT NULL
+                                FROM analysis_history
+                                WHERE id=? AND user_id=?''',
+                                (HISTORY_SUMMARY_CHARS, analysis_id, user_id)).fetchone()
+
+    def get_analysis_detail(self, user_id, analysis_id):
+        """按需读取单条记录的完整分析结果和最终报告"""
+        conn = self._get_conn()
+        with conn:
+            return conn.execute('''SELECT analysis_result, final_report
+                                FROM analysis_history
+                                WHERE id=? AND user_id=?''', (analysis_id, user_id)).fetchone()
+
+    def get_scale_trend(self, user_id, scale, limit=50):
+        """某个量表分随时间的变化，如 get_scale_trend(user_id, 'bdi_total')"""
+        conn = self._get_conn()
+        with conn:
+            return conn.execute('''SELECT scored_at, score, analysis_id
+                                FROM scale_scores
+                                WHERE user_id=? AND scale=?
+                                ORDER BY scored_at DESC
+                                LIMIT ?''', (user_id, scale, limit)).fetchall()
+
+    def get_scale_scores(self, analysis_id):
+        """一次提交的全部量表分 {量表名: 分数}"""
+        conn = self._get_conn()
+        with conn:
+            rows = conn.execute("SELECT scale, score FROM scale_scores WHERE analysis_id=?", (analysis_id,))
+            return dict(rows.fetchall())
+
+    def get_cohort_scale_stats(self, scale, since=None):
+        """全部用户某个量表分的统计：(人数, 次数, 平均分, 最低分, 最高分)"""
+        conn = self._get_conn()
+        with conn:
+            return conn.execute('''SELECT COUNT(DISTINCT user_id), COUNT(*), AVG(score), MIN(score), MAX(score)
+                                FROM scale_scores
+                                WHERE scale=? AND scored_at >= ?''', (scale, since or '')).fetchone()
+
     def get_user_second_reports(self, user_id, limit=50):
         """新增函数，用于获取用户的第二份分析报告"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        conn = self._get_conn()
+        with conn:
             cursor = conn.cursor()
             cursor.execute('''SELECT report_time, second_report 
                             FROM second_analysis_reports 
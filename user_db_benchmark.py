@@ -0,0 +1,104 @@
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from user_db import MIGRATIONS
+
+# 第几个到第几个迁移是索引（之前的迁移只建表，之后的迁移不计入索引耗时）
+FIRST_INDEX_MIGRATION = 3
+LAST_INDEX_MIGRATION = 4
+
+# 基准测试覆盖的常用查询
+QUERIES = {
+    "历史记录": ('''SELECT analysis_time, file_path, analysis_result, final_report
+                   FROM analysis_history WHERE user_id=? ORDER BY analysis_time DESC LIMIT 50''', 'user'),
+    "历史分页": ('''SELECT id, analysis_time, file_path, substr(analysis_result, 1, 60)
+                   FROM analysis_history WHERE user_id=? ORDER BY analysis_time DESC, id DESC LIMIT 21''', 'user'),
+    "第二份报告": ('''SELECT report_time, second_report
+                    FROM second_analysis_reports WHERE user_id=? ORDER BY report_time DESC LIMIT 50''', 'user'),
+    "问卷答案(按分析)": ("SELECT answers FROM questionnaire_answers WHERE analysis_id=?", 'analysis'),
+    "问卷答案(按用户)": ("SELECT COUNT(*) FROM questionnaire_answers WHERE user_id=?", 'user'),
+}
+
+
+def _migrate(conn, target):
+    """执行迁移直到 user_version == target"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in enumerate(MIGRATIONS[current:target], start=current + 1):
+        conn.execute("BEGIN")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+
+
+def _populate(conn, users, records_per_user):
+    """生成测试数据：每个用户若干条分析记录、问卷答案和第二份报告"""
+    start = datetime(2024, 1, 1)
+    with conn:
+        conn.executemany("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                         ((f"user{i}", "x" * 64) for i in range(users)))
+        history = []
+        for _ in range(users * records_per_user):
+            user_id = random.randint(1, users)
+            when = start + timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+            history.append((user_id, when.isoformat(), "painting.png", "分析结果" * 20))
+        conn.executemany('''INSERT INTO analysis_history (user_id, analysis_time, file_path, analysis_result)
+                            VALUES (?, ?, ?, ?)''', history)
+        conn.executemany('''INSERT INTO questionnaire_answers (user_id, analysis_id, answers)
+                            VALUES (?, ?, ?)''',
+                         ((user_id, i + 1, "{}") for i, (user_id, *_rest) in enumerate(history)))
+        conn.executemany('''INSERT INTO second_analysis_reports (user_id, report_time, second_report)
+                            VALUES (?, ?, ?)''',
+                         ((user_id, when, "报告") for user_id, when, *_rest in history))
+    return len(history)
+
+
+def _run_queries(conn, users, records, repeat):
+    for name, (sql, param) in QUERIES.items():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (1,)).fetchall()
+        values = [random.randint(1, users if param == 'user' else records) for _ in range(repeat)]
+        start = time.perf_counter()
+        for value in values:
+            conn.execute(sql, (value,)).fetchall()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"  {name}: {elapsed * 1e6:.0f} µs/次")
+        for row in plan:
+            print(f"      {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比建立索引前后常用查询的执行计划和耗时")
+    parser.add_argument("--users", type=int, default=200, help="测试用户数")
+    parser.add_argument("--records", type=int, default=500, help="每个用户的平均分析记录数")
+    parser.add_argument("--repeat", type=int, default=200, help="每个查询执行次数")
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        # 先迁移到建立索引之前的版本
+        _migrate(conn, FIRST_INDEX_MIGRATION - 1)
+        records = _populate(conn, args.users, args.records)
+        print(f"测试数据: {args.users} 个用户, {records} 条分析记录")
+
+        print("建立索引前:")
+        _run_queries(conn, args.users, records, args.repeat)
+
+        start = time.perf_counter()
+        _migrate(conn, LAST_INDEX_MIGRATION)
+        conn.execute("ANALYZE")
+        print(f"建立索引耗时: {time.perf_counter() - start:.2f} s")
+        # 其余迁移（如逐题答案回填）在计时之外执行
+        _migrate(conn, len(MIGRATIONS))
+
+        print("建立索引后:")
+        _run_queries(conn, args.users, records, args.repeat)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()